@@ -6,15 +6,24 @@ Main Streamlit Application
 import streamlit as st
 import os
 from dotenv import load_dotenv
+import asyncio
+import hashlib
+import json
 import logging
+import queue
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
 
 # Import our modules
-from src.pdf_processor import extract_text_from_pdf, get_pdf_metadata
+from src.pdf_processor import extract_text_from_pdf, get_pdf_metadata_from_bytes
 from src.chunking import DocumentChunker
 from src.embeddings import GeminiEmbedder
 from src.vector_store import VectorStore
 from src.gemini_client import GeminiRAGClient
+from src.query_cache import SemanticQueryCache
 from src.utils import save_uploaded_file, format_file_size
 from config.prompts import (
     LEGAL_SYSTEM_PROMPT,
@@ -28,6 +37,12 @@ from config.prompts import (
 # Load environment variables
 load_dotenv()
 
+# Cosine similarity threshold for reusing a cached answer on paraphrased queries
+SEMANTIC_CACHE_TAU = float(os.getenv("SEMANTIC_CACHE_TAU", 0.95))
+
+# On-disk cache of processed documents keyed by content hash
+PROCESS_CACHE_DIR = os.getenv("PROCESS_CACHE_DIR", "./data/cache")
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -43,54 +58,271 @@ st.set_page_config(
 st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 
 
+@st.cache_resource
+def get_embedder():
+    """Process-wide embedder shared across sessions and reruns"""
+    return GeminiEmbedder(os.environ["GEMINI_API_KEY"])
+
+
+@st.cache_resource
+def get_rag_client():
+    """Process-wide Gemini client shared across sessions and reruns"""
+    return GeminiRAGClient(os.environ["GEMINI_API_KEY"])
+
+
+@st.cache_resource
+def get_chunker():
+    """Process-wide chunker configured from the environment"""
+    chunk_size = int(os.getenv("CHUNK_SIZE", 1000))
+    chunk_overlap = int(os.getenv("CHUNK_OVERLAP", 200))
+    return DocumentChunker(chunk_size, chunk_overlap)
+
+
+@st.cache_resource
+def get_vector_store():
+    """Process-wide Chroma handle so the index is loaded only once"""
+    persist_dir = os.getenv("CHROMA_PERSIST_DIR", "./data/vectordb")
+    return VectorStore(persist_dir)
+
+
+def _new_semantic_cache():
+    """Fresh paraphrase cache sized and thresholded from the environment"""
+    return SemanticQueryCache(
+        max_entries=int(os.getenv("SEMANTIC_CACHE_SIZE", 256)),
+        tau=SEMANTIC_CACHE_TAU
+    )
+
+
 def initialize_session_state():
-    """Initialize Streamlit session state variables"""
-    if 'vector_store' not in st.session_state:
-        st.session_state.vector_store = None
+    """Initialize per-user Streamlit session state variables"""
     if 'collection' not in st.session_state:
         st.session_state.collection = None
     if 'current_doc_name' not in st.session_state:
         st.session_state.current_doc_name = None
     if 'messages' not in st.session_state:
         st.session_state.messages = []
-    if 'embedder' not in st.session_state:
-        st.session_state.embedder = None
-    if 'rag_client' not in st.session_state:
-        st.session_state.rag_client = None
-    if 'chunker' not in st.session_state:
-        st.session_state.chunker = None
+    if 'query_cache' not in st.session_state:
+        # Exact-match cache: normalized question -> result dict
+        st.session_state.query_cache = {}
+    if 'semantic_cache' not in st.session_state:
+        # Bounded embedding-keyed cache of full results, for paraphrase hits
+        st.session_state.semantic_cache = _new_semantic_cache()
+    if 'prewarmed_embeddings' not in st.session_state:
+        # Speculatively embedded suggested questions, keyed by question text
+        st.session_state.prewarmed_embeddings = {}
+    if 'history_limit' not in st.session_state:
+        # Number of past inquiries rendered per rerun
+        st.session_state.history_limit = 10
+    if 'sample_retrievals' not in st.session_state:
+        # Precomputed top-k retrievals for the suggested questions
+        st.session_state.sample_retrievals = {}
 
 
 def initialize_clients():
-    """Initialize API clients and components"""
-    api_key = os.getenv("GEMINI_API_KEY")
-    
-    if not api_key:
+    """Validate configuration; shared clients come from @st.cache_resource"""
+    if not os.getenv("GEMINI_API_KEY"):
         st.error(ERROR_MESSAGES['no_api_key'])
         st.stop()
-    
+
     try:
-        # Initialize components if not already done
-        if st.session_state.embedder is None:
-            st.session_state.embedder = GeminiEmbedder(api_key)
-            
-        if st.session_state.rag_client is None:
-            st.session_state.rag_client = GeminiRAGClient(api_key)
-            
-        if st.session_state.chunker is None:
-            chunk_size = int(os.getenv("CHUNK_SIZE", 1000))
-            chunk_overlap = int(os.getenv("CHUNK_OVERLAP", 200))
-            st.session_state.chunker = DocumentChunker(chunk_size, chunk_overlap)
-            
-        if st.session_state.vector_store is None:
-            persist_dir = os.getenv("CHROMA_PERSIST_DIR", "./data/vectordb")
-            st.session_state.vector_store = VectorStore(persist_dir)
-            
+        # Warm the shared singletons once per process
+        get_embedder()
+        get_rag_client()
+        get_chunker()
+        get_vector_store()
     except Exception as e:
         st.error(f"Initialization error: {str(e)}")
         st.stop()
 
 
+def embed_chunks_parallel(chunks, progress_callback=None, on_batch=None):
+    """
+    Embed chunks off the Streamlit thread using a bounded thread pool.
+
+    Chunks are sorted by length into micro-batches so batch payloads are
+    balanced, then results are written back in original index order.
+    Duplicate texts (legal boilerplate: definitions, signature blocks)
+    are embedded once and fanned out to every chunk that shares them.
+    on_batch, if given, is called with (chunk_indices, embeddings) as each
+    micro-batch completes, letting a consumer overlap work (e.g. vector
+    store writes) with the remaining embedding calls; the fanned-out
+    duplicates are included in those calls.
+    """
+    embedder = get_embedder()
+    max_workers = int(os.getenv("EMBED_PARALLELISM", 16))
+    batch_size = int(os.getenv("EMBED_BATCH", 64))
+
+    # Distinct text -> indices of every chunk carrying it (insert order)
+    positions = {}
+    for i, chunk in enumerate(chunks):
+        positions.setdefault(chunk['text'], []).append(i)
+    unique_texts = list(positions)
+
+    order = sorted(range(len(unique_texts)), key=lambda i: len(unique_texts[i]), reverse=True)
+    groups = [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+    embeddings = [None] * len(chunks)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(embedder.embed_batch, [unique_texts[i] for i in group]): group
+            for group in groups
+        }
+        done = 0
+        for future in as_completed(futures):
+            group = futures[future]
+            batch_embeddings = future.result()
+            chunk_indices = []
+            chunk_embeddings = []
+            for unique_idx, embedding in zip(group, batch_embeddings):
+                for idx in positions[unique_texts[unique_idx]]:
+                    embeddings[idx] = embedding
+                    chunk_indices.append(idx)
+                    chunk_embeddings.append(embedding)
+            if on_batch:
+                on_batch(chunk_indices, chunk_embeddings)
+            done += 1
+            if progress_callback:
+                progress_callback(done, len(groups))
+
+    return embeddings
+
+
+@st.cache_resource
+def get_sample_embeddings():
+    """Embed the suggested questions once per process"""
+    questions = SAMPLE_QUESTIONS['general'][:5]
+    embeddings = get_embedder().embed_batch(questions, task_type="retrieval_query")
+    return {q: e for q, e in zip(questions, embeddings) if e is not None}
+
+
+def prefetch_sample_retrievals(collection):
+    """
+    Precompute top-k retrievals for the suggested questions against the
+    freshly indexed document, so their buttons go straight to generation
+    """
+    top_k = int(os.getenv("TOP_K_RESULTS", 5))
+    try:
+        st.session_state.sample_retrievals = {
+            question: get_vector_store().search(collection, embedding, top_k=top_k)
+            for question, embedding in get_sample_embeddings().items()
+        }
+    except Exception as e:
+        logger.warning(f"Sample retrieval prefetch failed: {e}")
+        st.session_state.sample_retrievals = {}
+
+
+def load_cached_extraction(digest):
+    """
+    Load previously extracted text for a content digest, or None.
+    Useful when chunking config changed but the document bytes didn't.
+    """
+    path = os.path.join(PROCESS_CACHE_DIR, f"{digest}.txt")
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+    except OSError as e:
+        logger.warning(f"Ignoring unreadable extraction cache {path}: {e}")
+        return None
+
+
+def store_cached_extraction(digest, text):
+    """
+    Persist extracted text keyed by content digest
+    """
+    try:
+        os.makedirs(PROCESS_CACHE_DIR, exist_ok=True)
+        path = os.path.join(PROCESS_CACHE_DIR, f"{digest}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+    except OSError as e:
+        logger.warning(f"Could not write extraction cache: {e}")
+
+
+def load_processed_cache(digest):
+    """
+    Load cached chunks and embeddings for a content digest, or None.
+    The embedding matrix is memory-mapped, so a cache hit costs no bulk
+    read or parse; pages are faulted in as rows are actually touched.
+    """
+    manifest_path = os.path.join(PROCESS_CACHE_DIR, f"{digest}.json")
+    matrix_path = os.path.join(PROCESS_CACHE_DIR, f"{digest}.emb")
+    if not (os.path.exists(manifest_path) and os.path.exists(matrix_path)):
+        return None
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        # Keep the stored dtype (float16 when EMBEDDING_DTYPE asks for it)
+        matrix = np.memmap(
+            matrix_path, dtype=manifest['dtype'], mode="r"
+        ).reshape(-1, manifest['dim'])
+        return manifest['chunks'], list(matrix)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable process cache {digest}: {e}")
+        return None
+
+
+def store_processed_cache(digest, chunks, embeddings):
+    """
+    Persist chunks and embeddings keyed by content digest.
+    Embeddings go to a raw binary file (memmap-loadable), chunk dicts and
+    matrix shape to a small JSON manifest written last so its presence
+    implies a complete cache entry. Chunks whose embedding failed are
+    skipped so the cache stays aligned.
+    """
+    pairs = [(c, e) for c, e in zip(chunks, embeddings) if e is not None]
+    if not pairs:
+        return
+    try:
+        os.makedirs(PROCESS_CACHE_DIR, exist_ok=True)
+        matrix = np.stack([e for _, e in pairs])
+        matrix.tofile(os.path.join(PROCESS_CACHE_DIR, f"{digest}.emb"))
+        manifest = {
+            'dtype': str(matrix.dtype),
+            'dim': int(matrix.shape[1]),
+            'chunks': [c for c, _ in pairs],
+        }
+        with open(os.path.join(PROCESS_CACHE_DIR, f"{digest}.json"), "w",
+                  encoding="utf-8") as f:
+            json.dump(manifest, f)
+    except Exception as e:
+        logger.warning(f"Could not write process cache: {e}")
+
+
+def _start_chroma_writer(store, collection, chunks):
+    """
+    Start a single writer thread that drains (chunk_indices, embeddings)
+    sub-batches from a bounded queue into the collection, so HNSW index
+    writes proceed while later embedding batches are still in flight.
+    Returns (write_queue, thread, errors); enqueue None to stop.
+    """
+    write_queue = queue.Queue(maxsize=4)
+    errors = []
+
+    def _writer():
+        while True:
+            item = write_queue.get()
+            if item is None:
+                break
+            indices, embeddings = item
+            batch = [chunks[i] for i in indices]
+            try:
+                store.add_documents(
+                    collection,
+                    embeddings,
+                    [c['text'] for c in batch],
+                    metadatas=[c['metadata'] for c in batch],
+                    ids=[hashlib.sha1(c['text'].encode()).hexdigest() for c in batch]
+                )
+            except Exception as e:
+                errors.append(e)
+
+    thread = threading.Thread(target=_writer, daemon=True)
+    thread.start()
+    return write_queue, thread, errors
+
+
 def process_document(uploaded_file):
     """
     Process uploaded PDF through RAG pipeline
@@ -104,53 +336,117 @@ def process_document(uploaded_file):
             status_text.text("Saving document...")
             progress_bar.progress(10)
             file_path = save_uploaded_file(uploaded_file)
-            
-            # Step 2: Extract text
-            status_text.text("Extracting text from PDF...")
-            progress_bar.progress(20)
-            extraction_result = extract_text_from_pdf(file_path)
-            
-            if not extraction_result['success']:
-                st.error(f"Failed to extract text: {extraction_result.get('error', 'Unknown error')}")
-                return False
-                
-            full_text = extraction_result['text']
-            
-            # Step 3: Chunk document
-            status_text.text("Chunking document...")
-            progress_bar.progress(40)
-            chunks = st.session_state.chunker.smart_chunk(
-                full_text,
-                metadata={'source_file': uploaded_file.name}
-            )
-            
-            st.info(f"Created {len(chunks)} chunks")
-            
-            # Step 4: Generate embeddings
-            status_text.text("Generating embeddings...")
-            progress_bar.progress(60)
-            embedded_chunks = st.session_state.embedder.embed_chunks(chunks)
-            
+
+            # Identical bytes skip extraction, chunking and embedding entirely
+            digest = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+
+            # Name the collection after the content digest so a re-upload of
+            # the same bytes reuses the existing index instead of rebuilding
+            collection = get_vector_store().get_or_create_collection(f"doc_{digest[:16]}")
+
+            cached = load_processed_cache(digest)
+            indexed_during_embedding = False
+
+            if cached is not None:
+                chunks, embedded_chunks = cached
+                status_text.text("Reusing cached chunks and embeddings...")
+                progress_bar.progress(60)
+                st.info(f"Loaded {len(chunks)} chunks from cache")
+            else:
+                # Step 2: Extract text (cached on disk by content digest)
+                status_text.text("Extracting text from PDF...")
+                progress_bar.progress(20)
+                full_text = load_cached_extraction(digest)
+
+                if full_text is None:
+                    extraction_result = extract_text_from_pdf(file_path)
+
+                    if not extraction_result['success']:
+                        st.error(f"Failed to extract text: {extraction_result.get('error', 'Unknown error')}")
+                        return False
+
+                    full_text = extraction_result['text']
+                    store_cached_extraction(digest, full_text)
+
+                # Step 3: Chunk document
+                status_text.text("Chunking document...")
+                progress_bar.progress(40)
+                chunks = get_chunker().smart_chunk(
+                    full_text,
+                    metadata={'source': uploaded_file.name}
+                )
+
+                st.info(f"Created {len(chunks)} chunks")
+
+                # Step 4: Generate embeddings, overlapping vector store
+                # writes with the remaining embedding calls via a single
+                # writer thread behind a bounded queue
+                status_text.text("Generating embeddings...")
+                progress_bar.progress(60)
+
+                write_queue = writer_thread = None
+                on_batch = None
+                if collection.count() != len(chunks):
+                    write_queue, writer_thread, write_errors = _start_chroma_writer(
+                        get_vector_store(), collection, chunks
+                    )
+                    on_batch = lambda group, embs: write_queue.put((group, embs))
+
+                embedded_chunks = embed_chunks_parallel(
+                    chunks,
+                    progress_callback=lambda done, total: progress_bar.progress(
+                        60 + int(20 * done / total)
+                    ),
+                    on_batch=on_batch
+                )
+
+                if writer_thread is not None:
+                    write_queue.put(None)
+                    writer_thread.join()
+                    if write_errors:
+                        raise write_errors[0]
+                    indexed_during_embedding = True
+
+                store_processed_cache(digest, chunks, embedded_chunks)
+
             # Step 5: Store in vector database
             status_text.text("Storing in vector database...")
             progress_bar.progress(80)
+
+            if indexed_during_embedding or collection.count() == len(chunks):
+                # Written by the overlap pipeline above, or already fully
+                # indexed from a previous analysis
+                progress_bar.progress(100)
+            else:
+                # Cache-hit path: insert in bounded batches so each SQLite
+                # commit stays small. Each chunk already carries its own
+                # metadata from smart_chunk.
+                batch_size = int(os.getenv("CHROMA_BATCH_SIZE", 200))
+
+                num_added = 0
+                for start in range(0, len(chunks), batch_size):
+                    end = start + batch_size
+                    batch = chunks[start:end]
+                    num_added += get_vector_store().add_documents(
+                        collection,
+                        embedded_chunks[start:end],
+                        [c['text'] for c in batch],
+                        metadatas=[c['metadata'] for c in batch],
+                        ids=[hashlib.sha1(c['text'].encode()).hexdigest() for c in batch]
+                    )
+                    progress_bar.progress(min(100, 80 + int(20 * end / len(chunks))))
             
-            collection_name = f"doc_{uploaded_file.name.replace('.pdf', '').replace(' ', '_')}"
-            collection = st.session_state.vector_store.create_collection(
-                collection_name,
-                reset=True
-            )
-            
-            num_added = st.session_state.vector_store.add_documents(
-                collection,
-                embedded_chunks,
-                chunks, # Pass the text documents
-                metadatas=[{'source': uploaded_file.name}] * len(chunks)
-            )
-            
-            # Update session state
+            # Update session state. A different document invalidates both
+            # answer caches: their entries hold answers and sources from
+            # the previous collection and are not keyed by it.
+            if getattr(st.session_state.collection, "name", None) != collection.name:
+                st.session_state.query_cache = {}
+                st.session_state.semantic_cache = _new_semantic_cache()
             st.session_state.collection = collection
             st.session_state.current_doc_name = uploaded_file.name
+
+            # Warm the suggested-question retrievals for this document
+            prefetch_sample_retrievals(collection)
             
             # Complete
             progress_bar.progress(100)
@@ -168,6 +464,82 @@ def process_document(uploaded_file):
             return False
 
 
+def display_sources(sources):
+    """Render the source citations in an expander as one markdown payload"""
+    with st.expander("View Sources", expanded=False):
+        # A single st.markdown call means one websocket frame, not len(sources)
+        st.markdown("\n\n---\n\n".join(
+            f"**Source {s['source_number']}** - {s['section']} (Page: {s['page']})  \n"
+            f"Relevance: {s['similarity']:.2%}\n\n"
+            f"{s['text_preview']}"
+            for s in sources
+        ))
+
+
+def display_answer(result):
+    """Render an answer with its sources"""
+    st.markdown("### Answer")
+    st.markdown(f"""<div class="answer-box">{result['answer']}</div>""", unsafe_allow_html=True)
+    display_sources(result['sources'])
+
+
+def record_answer(question, result, query_embedding=None):
+    """Store a successful result in the caches and message history"""
+    st.session_state.query_cache[question.strip().lower()] = result
+
+    if query_embedding is not None:
+        st.session_state.semantic_cache.add(query_embedding, result)
+
+    st.session_state.messages.append({
+        'question': question,
+        'answer': result['answer'],
+        'sources': result['sources']
+    })
+
+
+def lookup_semantic_cache(query_embedding):
+    """
+    Return a cached result whose query embedding is within SEMANTIC_CACHE_TAU
+    cosine similarity of the given one, or None
+    """
+    return st.session_state.semantic_cache.lookup(query_embedding)
+
+
+async def _embed_query_with_prewarm(question):
+    """
+    Embed the live question while concurrently pre-warming the embedding of
+    the next suggested question, so sidebar clicks skip the embedding call.
+    """
+    embedder = get_embedder()
+    prewarmed = st.session_state.prewarmed_embeddings
+
+    if question in prewarmed:
+        return prewarmed.pop(question)
+
+    next_q = next(
+        (q for q in SAMPLE_QUESTIONS['general'][:5]
+         if q != question and q not in prewarmed),
+        None
+    )
+
+    if next_q is None:
+        return await embedder.aembed_query(question)
+
+    query_embedding, next_embedding = await asyncio.gather(
+        embedder.aembed_query(question),
+        embedder.aembed_query(next_q),
+        return_exceptions=True
+    )
+
+    if not isinstance(next_embedding, Exception) and next_embedding is not None:
+        prewarmed[next_q] = next_embedding
+
+    if isinstance(query_embedding, Exception):
+        logger.error(f"Query embedding failed: {query_embedding}")
+        return None
+    return query_embedding
+
+
 def answer_question(question: str):
     """
     Answer question using RAG pipeline
@@ -175,70 +547,139 @@ def answer_question(question: str):
     if st.session_state.collection is None:
         st.error(ERROR_MESSAGES['no_document'])
         return
-    
+
+    # Tier 1: exact-match cache (skips both the embedding and generation calls)
+    cached = st.session_state.query_cache.get(question.strip().lower())
+    if cached is not None:
+        display_answer(cached)
+        # Keep the Inquiry History complete: a repeat question is still an
+        # inquiry (record_answer's exact-cache write is a same-key no-op)
+        record_answer(question, cached)
+        return
+
     with st.spinner("Searching document and generating answer..."):
         try:
-            # Step 1: Generate query embedding
-            query_embedding = st.session_state.embedder.embed_query(question)
-            
-            if query_embedding is None:
-                st.error("Failed to generate query embedding")
-                return
-            
-            # Step 2: Search vector database
-            top_k = int(os.getenv("TOP_K_RESULTS", 5))
-            relevant_chunks = st.session_state.vector_store.search(
-                st.session_state.collection,
-                query_embedding,
-                top_k=top_k
-            )
+            query_embedding = None
+            relevant_chunks = st.session_state.sample_retrievals.get(question)
+
+            if relevant_chunks is None:
+                # Step 1: Generate query embedding (pre-warming the next suggested one)
+                query_embedding = asyncio.run(_embed_query_with_prewarm(question))
+
+                if query_embedding is None:
+                    st.error("Failed to generate query embedding")
+                    return
+
+                # Tier 2: semantic cache (skips search and generation for paraphrases)
+                cached = lookup_semantic_cache(query_embedding)
+                if cached is not None:
+                    display_answer(cached)
+                    record_answer(question, cached)
+                    return
+
+                # Step 2: Search vector database
+                top_k = int(os.getenv("TOP_K_RESULTS", 5))
+                relevant_chunks = get_vector_store().search(
+                    st.session_state.collection,
+                    query_embedding,
+                    top_k=top_k
+                )
             
             if not relevant_chunks:
                 st.warning("No relevant information found in the document")
                 return
             
-            # Step 3: Generate answer using Gemini
-            result = st.session_state.rag_client.generate_answer(
+            # Step 3: Stream the answer from Gemini as it is generated,
+            # re-rendering a placeholder so the growing text keeps the
+            # same answer-box styling as cache-hit replays. The token
+            # budget is applied here so the citations below describe the
+            # same chunks the model is prompted with.
+            rag_client = get_rag_client()
+            relevant_chunks = rag_client.select_context(relevant_chunks)
+            st.markdown("### Answer")
+            placeholder = st.empty()
+            answer_text = ""
+            for delta in rag_client.generate_answer_stream(
                 question=question,
                 context_chunks=relevant_chunks,
                 system_prompt=LEGAL_SYSTEM_PROMPT
-            )
-            
-            if result['success']:
-                # Display answer
-                st.markdown("### Answer")
-                st.markdown(f"""<div class="answer-box">{result['answer']}</div>""", unsafe_allow_html=True)
-                
-                # Display sources
-                with st.expander("View Sources", expanded=False):
-                    for source in result['sources']:
-                        st.markdown(f"""
-                        **Source {source['source_number']}** - {source['section']} (Page: {source['page']})  
-                        Relevance: {source['similarity']:.2%}
-                        
-                        {source['text_preview']}
-                        
-                        ---
-                        """)
-                
-                # Add to message history
-                st.session_state.messages.append({
-                    'question': question,
-                    'answer': result['answer'],
-                    'sources': result['sources']
-                })
-                
-            else:
-                st.error(f"Failed to generate answer: {result.get('error', 'Unknown error')}")
-                
+            ):
+                answer_text += delta
+                placeholder.markdown(
+                    f"""<div class="answer-box">{answer_text}</div>""",
+                    unsafe_allow_html=True
+                )
+
+            sources = rag_client.build_sources(relevant_chunks)
+            display_sources(sources)
+
+            result = {
+                'success': True,
+                'answer': answer_text,
+                'sources': sources
+            }
+            record_answer(question, result, query_embedding)
+
         except Exception as e:
             st.error(f"Error answering question: {str(e)}")
             logger.error(f"Question answering failed: {e}", exc_info=True)
 
 
+@st.cache_data(show_spinner=False)
+def _cached_pdf_metadata(name, size, _uploaded_file):
+    """
+    PDF metadata keyed by (name, size), so switching documents back never
+    re-parses. The underscore keeps the file handle out of the cache key;
+    hashing name+size is O(1) per rerun, and the bytes are only
+    materialized inside here on a miss.
+    """
+    return get_pdf_metadata_from_bytes(_uploaded_file.getvalue())
+
+
+@st.cache_data(show_spinner=False)
+def _history_markdown(question, answer):
+    """Cached markdown body for an unchanged history entry"""
+    return f"**Question:** {question}\n\n**Answer:** {answer}"
+
+
+@st.fragment
+def _chat_panel():
+    """Chat area; reruns independently of the rest of the page"""
+    st.success(f"Active Document: **{st.session_state.current_doc_name}**")
+
+    # Question input
+    question = st.chat_input("Enter your query regarding the document...")
+
+    if question:
+        # Display user question
+        with st.chat_message("user"):
+            st.markdown(question)
+
+        # Generate and display answer
+        with st.chat_message("assistant"):
+            answer_question(question)
+
+    # Display chat history (paginated so reruns stay O(limit), not O(N))
+    if st.session_state.messages:
+        st.markdown("---")
+        st.markdown("### Inquiry History")
+
+        limit = st.session_state.history_limit
+        recent = st.session_state.messages[-limit:]
+
+        for i, msg in enumerate(reversed(recent)):
+            with st.expander(f"Q: {msg['question'][:100]}...", expanded=(i==0)):
+                st.markdown(_history_markdown(msg['question'], msg['answer']))
+
+        if len(st.session_state.messages) > limit:
+            if st.button("Load older inquiries"):
+                st.session_state.history_limit += 10
+                st.rerun()
+
+
 def main():
     """Main application"""
-    
+
     # Initialize
     initialize_session_state()
     initialize_clients()
@@ -257,15 +698,21 @@ def main():
         )
         
         if uploaded_file:
-            # Show file info
-            file_size = len(uploaded_file.getvalue())
-            st.info(f"{uploaded_file.name}\nSize: {format_file_size(file_size)}")
+            # Show file info (.size is O(1); getvalue() would copy the bytes)
+            st.info(f"{uploaded_file.name}\nSize: {format_file_size(uploaded_file.size)}")
+
+            metadata = _cached_pdf_metadata(
+                uploaded_file.name, uploaded_file.size, uploaded_file
+            )
+            if metadata.get('Title'):
+                st.caption(f"Title: {metadata['Title']}")
             
-            # Process button
+            # Process button. No st.rerun() afterwards: process_document
+            # updates session state before the main area renders, so the
+            # same script run already shows the active document.
             if st.button("Analyze Document", type="primary"):
                 if process_document(uploaded_file):
                     st.success("Analysis Complete")
-                    st.rerun()
         
         # Sample questions
         if st.session_state.current_doc_name:
@@ -288,108 +735,90 @@ def main():
     # Main area
     
     if st.session_state.current_doc_name:
-        st.success(f"Active Document: **{st.session_state.current_doc_name}**")
-        
-        # Question input
-        question = st.chat_input("Enter your query regarding the document...")
-        
-        if question:
-            # Display user question
-            with st.chat_message("user"):
-                st.markdown(question)
-            
-            # Generate and display answer
-            with st.chat_message("assistant"):
-                answer_question(question)
-        
-        # Display chat history
-        if st.session_state.messages:
-            st.markdown("---")
-            st.markdown("### Inquiry History")
-            
-            for i, msg in enumerate(reversed(st.session_state.messages)):
-                with st.expander(f"Q: {msg['question'][:100]}...", expanded=(i==0)):
-                    st.markdown(f"**Question:** {msg['question']}")
-                    st.markdown(f"**Answer:** {msg['answer']}")
-                    
+        _chat_panel()
     else:
-        # Welcome message with modern design
-        
-        st.markdown(
-            '<div style="color: var(--text-secondary); background: var(--bg-card); padding: 1rem 1.5rem; border-radius: 12px; border: 1px solid var(--border-subtle); margin-bottom: 2rem;">'
-            'Upload a legal document from the sidebar to begin your analysis.'
-            '</div>', 
-            unsafe_allow_html=True
-        )
-        
-        # Feature showcase with modern cards
-        col1, col2, col3 = st.columns(3)
-        
-        with col1:
-            st.markdown("""
-            <div class="feature-card">
-                <div class="feature-icon"></div>
-                <h3 style="color: var(--accent-gold); margin-bottom: 1rem;">Semantic Search</h3>
-                <p style="color: var(--text-secondary); line-height: 1.6;">
-                    Context-aware retrieval of relevant clauses and provisions using AI embeddings.
-                </p>
-            </div>
-            """, unsafe_allow_html=True)
-            
-        with col2:
-            st.markdown("""
-            <div class="feature-card">
-                <div class="feature-icon"></div>
-                <h3 style="color: var(--accent-gold); margin-bottom: 1rem;">Source Citations</h3>
-                <p style="color: var(--text-secondary); line-height: 1.6;">
-                    Every answer includes direct references to source text with page numbers and relevance scores.
-                </p>
-            </div>
-            """, unsafe_allow_html=True)
-            
-        with col3:
-            st.markdown("""
-            <div class="feature-card">
-                <div class="feature-icon"></div>
-                <h3 style="color: var(--accent-gold); margin-bottom: 1rem;">AI Precision</h3>
-                <p style="color: var(--text-secondary); line-height: 1.6;">
-                    Powered by advanced RAG architecture and Google's Gemini AI for accurate legal analysis.
-                </p>
-            </div>
-            """, unsafe_allow_html=True)
+        _welcome_panel()
+
+
+@st.fragment
+def _welcome_panel():
+    """Static welcome content; skipped on reruns whose inputs are unchanged"""
+
+    st.markdown(
+        '<div style="color: var(--text-secondary); background: var(--bg-card); padding: 1rem 1.5rem; border-radius: 12px; border: 1px solid var(--border-subtle); margin-bottom: 2rem;">'
+        'Upload a legal document from the sidebar to begin your analysis.'
+        '</div>', 
+        unsafe_allow_html=True
+    )
+    
+    # Feature showcase with modern cards
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.markdown("""
+        <div class="feature-card">
+            <div class="feature-icon"></div>
+            <h3 style="color: var(--accent-gold); margin-bottom: 1rem;">Semantic Search</h3>
+            <p style="color: var(--text-secondary); line-height: 1.6;">
+                Context-aware retrieval of relevant clauses and provisions using AI embeddings.
+            </p>
+        </div>
+        """, unsafe_allow_html=True)
         
-        # Additional info section
-        st.markdown("<br><br>", unsafe_allow_html=True)
+    with col2:
+        st.markdown("""
+        <div class="feature-card">
+            <div class="feature-icon"></div>
+            <h3 style="color: var(--accent-gold); margin-bottom: 1rem;">Source Citations</h3>
+            <p style="color: var(--text-secondary); line-height: 1.6;">
+                Every answer includes direct references to source text with page numbers and relevance scores.
+            </p>
+        </div>
+        """, unsafe_allow_html=True)
         
-        col1, col2 = st.columns(2)
+    with col3:
+        st.markdown("""
+        <div class="feature-card">
+            <div class="feature-icon"></div>
+            <h3 style="color: var(--accent-gold); margin-bottom: 1rem;">AI Precision</h3>
+            <p style="color: var(--text-secondary); line-height: 1.6;">
+                Powered by advanced RAG architecture and Google's Gemini AI for accurate legal analysis.
+            </p>
+        </div>
+        """, unsafe_allow_html=True)
+    
+    # Additional info section
+    st.markdown("<br><br>", unsafe_allow_html=True)
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.markdown("""
+        <div style="background: var(--bg-card); padding: 1.5rem; border-radius: 12px; border: 1px solid var(--border-subtle);">
+            <h4 style="color: var(--accent-gold); margin-bottom: 1rem;">Key Features</h4>
+            <ul style="color: var(--text-secondary); line-height: 2;">
+                <li>PDF document processing</li>
+                <li>Intelligent text chunking</li>
+                <li>Vector-based semantic search</li>
+                <li>Natural language Q&A</li>
+                <li>Citation tracking</li>
+            </ul>
+        </div>
+        """, unsafe_allow_html=True)
         
-        with col1:
-            st.markdown("""
-            <div style="background: var(--bg-card); padding: 1.5rem; border-radius: 12px; border: 1px solid var(--border-subtle);">
-                <h4 style="color: var(--accent-gold); margin-bottom: 1rem;">Key Features</h4>
-                <ul style="color: var(--text-secondary); line-height: 2;">
-                    <li>PDF document processing</li>
-                    <li>Intelligent text chunking</li>
-                    <li>Vector-based semantic search</li>
-                    <li>Natural language Q&A</li>
-                    <li>Citation tracking</li>
-                </ul>
-            </div>
-            """, unsafe_allow_html=True)
-            
-        with col2:
-            st.markdown("""
-            <div style="background: var(--bg-card); padding: 1.5rem; border-radius: 12px; border: 1px solid var(--border-subtle);">
-                <h4 style="color: var(--accent-gold); margin-bottom: 1rem;">Use Cases</h4>
-                <ul style="color: var(--text-secondary); line-height: 2;">
-                    <li>Contract analysis</li>
-                    <li>Legal research</li>
-                    <li>Compliance review</li>
-                    <li>Due diligence</li>
-                    <li>Document summarization</li>
-                </ul>
-            </div>
-            """, unsafe_allow_html=True)
+    with col2:
+        st.markdown("""
+        <div style="background: var(--bg-card); padding: 1.5rem; border-radius: 12px; border: 1px solid var(--border-subtle);">
+            <h4 style="color: var(--accent-gold); margin-bottom: 1rem;">Use Cases</h4>
+            <ul style="color: var(--text-secondary); line-height: 2;">
+                <li>Contract analysis</li>
+                <li>Legal research</li>
+                <li>Compliance review</li>
+                <li>Due diligence</li>
+                <li>Document summarization</li>
+            </ul>
+        </div>
+        """, unsafe_allow_html=True)
 
 
 if __name__ == "__main__":
@@ -1,4 +1,5 @@
 import os
+import re
 import shutil
 import logging
 from fastapi import FastAPI, UploadFile, File, HTTPException
@@ -51,6 +52,14 @@ chunker = DocumentChunker(
     chunk_overlap=int(os.getenv("CHUNK_OVERLAP", 200))
 )
 
+# Strips the .pdf suffix and collapses whitespace runs in one pass
+_COLLECTION_NAME_RE = re.compile(r"\.pdf$|(\s+)")
+
+
+def _sanitize_collection_name(filename):
+    return _COLLECTION_NAME_RE.sub(lambda m: "_" if m.group(1) else "", filename)
+
+
 class QueryRequest(BaseModel):
     collection_name: str
     query: str
@@ -87,7 +96,7 @@ async def upload_document(file: UploadFile = File(...)):
         embedded_chunks = embedder.embed_chunks(chunks)
         
         # Store in Vector DB
-        collection_name = f"doc_{file.filename.replace('.pdf', '').replace(' ', '_')}"
+        collection_name = f"doc_{_sanitize_collection_name(file.filename)}"
         collection = vector_store.create_collection(collection_name, reset=True)
         
         vector_store.add_documents(
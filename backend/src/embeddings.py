@@ -3,7 +3,11 @@ Embeddings Module using Gemini
 """
 import google.generativeai as genai
 import logging
+import random
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
@@ -15,72 +19,98 @@ class GeminiEmbedder:
         # However, list_models can be slow, so we'll just try and catch.
 
         
-    def embed_chunks(self, chunks, batch_size=10):
+    def embed_batch(self, texts, task_type="retrieval_document"):
         """
-        Embed a list of text chunks with batching and rate limiting
+        Embed a list of texts with a single batched API call.
+        One request to the batch endpoint replaces N per-text round-trips,
+        so callers embedding a handful of strings (e.g. multi-query
+        retrieval) pay one network latency instead of N.
         """
-        embeddings = []
-        
-        for i in range(0, len(chunks), batch_size):
-            batch = chunks[i:i + batch_size]
+        try:
+            result = genai.embed_content(
+                model=self.model_name,
+                content=list(texts),
+                task_type=task_type
+            )
+            return result['embedding']
+        except Exception as e:
+            logger.error(f"Batch embedding failed: {str(e)}")
+            return [None] * len(texts) # Keep index alignment
+
+    def _embed_batch_with_fallback(self, batch, batch_index):
+        """
+        Embed one batch, falling back through alternate models and finally
+        to per-chunk requests. Always returns len(batch) entries (None for
+        chunks that failed everywhere) so index alignment is preserved.
+        """
+        # Small jitter so concurrent batches don't hit the API in lockstep
+        time.sleep(random.uniform(0, 0.05))
+        try:
+            # Attempt to use the configured model
+            result = genai.embed_content(
+                model=self.model_name,
+                content=batch,
+                task_type="retrieval_document"
+            )
+            return list(result['embedding'])
+        except Exception as e:
+            logger.warning(f"Error embedding batch {batch_index} with {self.model_name}: {str(e)}. Attempting fallback...")
+
+        # Logic to determine which model to try for fallback
+        fallback_models = ["models/gemini-embedding-001", "models/embedding-001"]
+
+        for fallback_model in fallback_models:
             try:
-                # Attempt to use the configured model
-                result = genai.embed_content(
-                    model=self.model_name,
+                res = genai.embed_content(
+                    model=fallback_model,
                     content=batch,
                     task_type="retrieval_document"
                 )
-                
-                # Check format of result (can vary by version)
-                if 'embedding' in result:
-                    embeddings.extend(result['embedding'])
-                else:
-                    # Handle batch list output
-                    for entry in result['embedding']: 
-                         embeddings.append(entry)
-                         
-                # Rate limit safety
-                time.sleep(0.5)
-                
-            except Exception as e:
-                logger.warning(f"Error embedding batch {i} with {self.model_name}: {str(e)}. Attempting fallback...")
-                
-                # Logic to determine which model to try for fallback
-                fallback_models = ["models/gemini-embedding-001", "models/embedding-001"]
-                
-                success = False
-                for fallback_model in fallback_models:
-                    try:
-                        res = genai.embed_content(
-                            model=fallback_model,
-                            content=batch,
-                            task_type="retrieval_document"
-                        )
-                        embeddings.extend(res['embedding'])
-                        success = True
-                        logger.info(f"Successfully used fallback model: {fallback_model}")
-                        break
-                    except Exception as fallback_e:
-                        logger.warning(f"Fallback to {fallback_model} failed: {str(fallback_e)}")
-                        continue
-                
-                if not success:
-                    logger.error(f"All batch embedding attempts failed for batch {i}. Trying individual chunks...")
-                    # Fallback of fallbacks: try one by one if batch fails completely
-                    for text in batch:
-                        try:
-                            res = genai.embed_content(
-                                model="models/gemini-embedding-001",
-                                content=text,
-                                task_type="retrieval_document"
-                            )
-                            embeddings.append(res['embedding'])
-                            time.sleep(0.2)
-                        except Exception as inner_e:
-                            logger.error(f"Failed to embed individual chunk: {inner_e}")
-                            embeddings.append(None) # Keep index alignment
+                logger.info(f"Successfully used fallback model: {fallback_model}")
+                return list(res['embedding'])
+            except Exception as fallback_e:
+                logger.warning(f"Fallback to {fallback_model} failed: {str(fallback_e)}")
+                continue
 
-                        
+        logger.error(f"All batch embedding attempts failed for batch {batch_index}. Trying individual chunks...")
+        # Fallback of fallbacks: try one by one if batch fails completely
+        embeddings = []
+        for text in batch:
+            try:
+                res = genai.embed_content(
+                    model="models/gemini-embedding-001",
+                    content=text,
+                    task_type="retrieval_document"
+                )
+                embeddings.append(res['embedding'])
+                time.sleep(0.2)
+            except Exception as inner_e:
+                logger.error(f"Failed to embed individual chunk: {inner_e}")
+                embeddings.append(None) # Keep index alignment
+        return embeddings
+
+    def embed_chunks(self, chunks, batch_size=10, max_workers=4):
+        """
+        Embed a list of text chunks with batched, concurrent requests.
+        Batches are network-bound, so a small thread pool overlaps their
+        round-trips instead of the old serial loop with a fixed sleep
+        between batches. Results are written back into a pre-sized list,
+        so order is preserved regardless of completion order.
+        """
+        chunks = list(chunks)
+        embeddings = [None] * len(chunks)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(
+                    self._embed_batch_with_fallback,
+                    chunks[start:start + batch_size], start
+                ): start
+                for start in range(0, len(chunks), batch_size)
+            }
+            for future in as_completed(futures):
+                start = futures[future]
+                for offset, embedding in enumerate(future.result()):
+                    embeddings[start + offset] = embedding
         return embeddings
 
     def embed_query(self, query):
@@ -107,3 +137,16 @@ class GeminiEmbedder:
         logger.error(f"All embedding attempts failed. Last error: {str(last_error)}")
         return None
 
+    @staticmethod
+    def calculate_similarity(a, b):
+        """
+        Cosine similarity between two embeddings in one BLAS dot product;
+        0.0 on zero-norm input
+        """
+        a = np.asarray(a, dtype=np.float32)
+        b = np.asarray(b, dtype=np.float32)
+        denom = float(np.linalg.norm(a)) * float(np.linalg.norm(b))
+        if denom == 0.0:
+            return 0.0
+        return float(a @ b) / denom
+
@@ -12,50 +12,69 @@ class GeminiRAGClient:
         genai.configure(api_key=api_key)
         self.model = genai.GenerativeModel(model_name)
         
+    def _build_prompt(self, question, context_chunks, system_prompt):
+        """
+        Assemble the full RAG prompt from retrieved context
+        """
+        # context_chunks is a list of dicts now
+        context_texts = [chunk["text"] if isinstance(chunk, dict) else chunk for chunk in context_chunks]
+        context_text = "\n\n---\n\n".join(context_texts)
+
+        return system_prompt.format(
+            context=context_text,
+            question=question
+        )
+
+    def generate_answer_stream(self, question, context_chunks, system_prompt):
+        """
+        Stream the answer as text deltas while Gemini generates it.
+        Call build_sources(context_chunks) afterwards for the citations.
+        """
+        full_prompt = self._build_prompt(question, context_chunks, system_prompt)
+        response = self.model.generate_content(full_prompt, stream=True)
+        for part in response:
+            if part.text:
+                yield part.text
+
+    def build_sources(self, context_chunks):
+        """
+        Build the citation payload from the retrieved chunks
+        """
+        sources = []
+        for i, chunk in enumerate(context_chunks):
+            if isinstance(chunk, dict):
+                text = chunk["text"]
+                similarity = chunk.get("similarity", 0.0)
+                metadata = chunk.get("metadata", {})
+                source_name = metadata.get("source", "N/A")
+            else:
+                text = chunk
+                similarity = 0.0
+                source_name = "N/A"
+
+            sources.append({
+                "source_number": i + 1,
+                "section": f"Source: {source_name}",
+                "page": "N/A",
+                "similarity": similarity,
+                "text_preview": text[:200] + "..."
+            })
+        return sources
+
     def generate_answer(self, question, context_chunks, system_prompt):
         """
         Generate answer using Gemini with retrieved context
         """
         try:
-            # Prepare context
-            # context_chunks is a list of dicts now
-            context_texts = [chunk["text"] if isinstance(chunk, dict) else chunk for chunk in context_chunks]
-            context_text = "\n\n---\n\n".join(context_texts)
-            
-            # Construct prompt
-            full_prompt = system_prompt.format(
-                context=context_text,
-                question=question
-            )
-            
+            full_prompt = self._build_prompt(question, context_chunks, system_prompt)
+
             # Generate response
             response = self.model.generate_content(full_prompt)
-            
-            # Extract sources
-            sources = []
-            for i, chunk in enumerate(context_chunks):
-                if isinstance(chunk, dict):
-                    text = chunk["text"]
-                    similarity = chunk.get("similarity", 0.0)
-                    metadata = chunk.get("metadata", {})
-                    source_name = metadata.get("source", "N/A")
-                else:
-                    text = chunk
-                    similarity = 0.0
-                    source_name = "N/A"
-                    
-                sources.append({
-                    "source_number": i + 1,
-                    "section": f"Source: {source_name}",
-                    "page": "N/A", 
-                    "similarity": similarity, 
-                    "text_preview": text[:200] + "..."
-                })
 
             return {
                 "success": True,
                 "answer": response.text,
-                "sources": sources
+                "sources": self.build_sources(context_chunks)
             }
             
         except Exception as e:
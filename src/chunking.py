@@ -1,29 +1,567 @@
 """
 Document Chunking Module
 """
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+import dataclasses
+import functools
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import tiktoken
+
+# Optional SIMD multi-pattern matcher; all three section styles are then
+# found in one DFA pass at memory-bandwidth speed instead of three
+# backtracking-engine passes
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+# Precompiled boundary patterns, shared by every chunker instance
+_PARA_RE = re.compile(r"\n\s*\n")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+# Emptiness test that stops at the first non-whitespace character instead
+# of allocating a stripped copy of the whole string
+_NONWS = re.compile(r"\S").search
+
+# Legal section header styles. The regex path compiles them into one
+# alternation, so detection is a single pass over the document with
+# lastgroup naming the style; the same bodies feed the Hyperscan
+# database, which can't take named groups.
+_SECTION_STYLES = (
+    ('section', r"^(?:SECTION|ARTICLE)\s+[A-Z0-9IVXLC][^\n]*$"),
+    ('numbered', r"^\d+(?:\.\d+)*\.?\s+[^\n]{3,80}$"),
+    # [ \t\r] rather than \s: a caps header must not span lines
+    ('caps', r"^[A-Z][A-Z \t\r()&,\-]{2,79}$"),
+)
+_SECTION_RE = re.compile(
+    "|".join(f"(?P<{kind}>{pattern})" for kind, pattern in _SECTION_STYLES),
+    re.MULTILINE
+)
+_SECTION_NOCAPS_RE = re.compile(
+    "|".join(f"(?P<{kind}>{pattern})" for kind, pattern in _SECTION_STYLES[:2]),
+    re.MULTILINE
+)
+
+_hyperscan_db = None
+
+
+def _get_hyperscan_db():
+    global _hyperscan_db
+    if _hyperscan_db is None:
+        _hyperscan_db = hyperscan.Database()
+        _hyperscan_db.compile(
+            expressions=[pattern.encode() for _, pattern in _SECTION_STYLES],
+            ids=list(range(len(_SECTION_STYLES))),
+            flags=[hyperscan.HS_FLAG_MULTILINE | hyperscan.HS_FLAG_SOM_LEFTMOST]
+            * len(_SECTION_STYLES),
+        )
+    return _hyperscan_db
+
+
+def _find_sections_hyperscan(text):
+    """
+    Find all section headers with one Hyperscan block-mode scan.
+    Hyperscan reports every match end as it streams, so the longest span
+    per start offset is kept; requires ASCII text so byte offsets equal
+    character offsets.
+    """
+    spans = {}
+
+    def on_match(pattern_id, start, end, flags, context):
+        prev = spans.get(start)
+        if prev is None or end > prev[1]:
+            spans[start] = (pattern_id, end)
+
+    _get_hyperscan_db().scan(text.encode("ascii"), match_event_handler=on_match)
+    return [
+        (start, text[start:end].strip(), _SECTION_STYLES[pattern_id][0])
+        for start, (pattern_id, end) in sorted(spans.items())
+    ]
+
+# Above this size (and for ASCII text, where byte and character offsets
+# coincide) the caps-header style is detected with a vectorized byte scan
+# instead of the backtracking regex alternative
+_CAPS_SCAN_MIN_CHARS = 65536
+
+
+def _find_caps_headers(text):
+    """
+    Vectorized all-caps header detection for large ASCII documents.
+    Views the text as a uint8 array, marks allowed header bytes with
+    boolean ufuncs, and tests each newline-delimited line via a prefix
+    sum, so no Python-level loop touches the document body. Returns
+    (start_offset, header_line) tuples.
+    """
+    arr = np.frombuffer(text.encode("ascii"), dtype=np.uint8)
+    allowed = (
+        ((arr >= 0x41) & (arr <= 0x5A))                  # A-Z
+        | (arr == 0x20) | (arr == 0x09) | (arr == 0x0D)  # space, tab, CR
+        | (arr == 0x28) | (arr == 0x29)                  # ( )
+        | (arr == 0x26) | (arr == 0x2C) | (arr == 0x2D)  # & , -
+    )
+    prefix = np.concatenate(([0], np.cumsum(allowed)))
+
+    newlines = np.flatnonzero(arr == 0x0A)
+    bounds = np.concatenate(([-1], newlines, [len(arr)]))
+    starts = bounds[:-1] + 1
+    ends = bounds[1:]
+    lengths = ends - starts
+
+    ok = (lengths >= 3) & (lengths <= 80)
+    ok &= prefix[ends] - prefix[starts] == lengths
+    # First character must be a capital letter, as in the regex
+    nonempty = lengths > 0
+    first = np.zeros(len(starts), dtype=bool)
+    first[nonempty] = (arr[starts[nonempty]] >= 0x41) & (arr[starts[nonempty]] <= 0x5A)
+    ok &= first
+
+    return [
+        (int(s), text[int(s):int(e)])
+        for s, e in zip(starts[ok], ends[ok])
+    ]
+
+
+@functools.lru_cache(maxsize=1)
+def _get_encoding(name="cl100k_base"):
+    """Load the BPE encoding once per process; construction is expensive"""
+    return tiktoken.get_encoding(name)
+
+
+# Token counts are a property of the text (and shared encoding) alone, so
+# the memo lives at module level: section-aware chunking re-counting a
+# paragraph it already saw, and every chunker instance in the process,
+# hit the same cache
+@functools.lru_cache(maxsize=8192)
+def _count_tokens_cached(text):
+    # encode_ordinary skips the special-token scan; legal text never
+    # contains GPT sentinel tokens, so that pass is pure overhead
+    return len(_get_encoding().encode_ordinary(text))
+
+
+@dataclasses.dataclass
+class ChunkTable:
+    """
+    Columnar (structure-of-arrays) view of a chunk list for the bulk
+    embedding/ingest stages: one column per field instead of N small
+    dicts, so texts can go to the embedder and the embedding matrix to
+    the vector store without per-row repacking. VectorStore.add_documents
+    already takes separate column arguments, and the embeddings column
+    is exactly the contiguous float32 matrix it fast-paths.
+    Per-chunk dicts remain the interchange format elsewhere; convert at
+    the stage boundary with from_dicts / to_dicts.
+    """
+    texts: list
+    metadatas: list
+    token_counts: np.ndarray = None
+    embeddings: np.ndarray = None
+
+    @classmethod
+    def from_dicts(cls, chunks):
+        metadatas = [chunk['metadata'] for chunk in chunks]
+        counts = [m.get('token_count') for m in metadatas]
+        return cls(
+            texts=[chunk['text'] for chunk in chunks],
+            metadatas=metadatas,
+            token_counts=(
+                np.asarray(counts, dtype=np.int32)
+                if counts and all(c is not None for c in counts) else None
+            ),
+        )
+
+    def to_dicts(self):
+        """Row view for code that wants per-chunk dicts back"""
+        return [
+            {'text': text, 'metadata': metadata}
+            for text, metadata in zip(self.texts, self.metadatas)
+        ]
+
+    def __len__(self):
+        return len(self.texts)
+
 
 class DocumentChunker:
-    def __init__(self, chunk_size=1000, chunk_overlap=200):
+    def __init__(self, chunk_size=1000, chunk_overlap=200, min_chunk_chars=20):
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
-        self.splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            separators=["\n\n", "\n", ".", " ", ""],
-            length_function=len
+        # Chunks shorter than this (stray page numbers, orphaned header
+        # fragments) carry no retrievable content and only pollute the
+        # index; they are pruned inline at emission, not in a second pass
+        self.min_chunk_chars = min_chunk_chars
+
+    def _should_keep(self, chunk):
+        return len(chunk) >= self.min_chunk_chars and _NONWS(chunk) is not None
+
+    def count_tokens(self, text):
+        """
+        Number of BPE tokens in text, memoized per exact string
+        """
+        return _count_tokens_cached(text)
+
+    def count_tokens_batch(self, texts, num_threads=None):
+        """
+        Token counts for many strings via one encode_batch call.
+        tiktoken's per-call FFI dispatch dominates on short strings;
+        encode_batch crosses into the Rust core once and fans the work
+        out across threads there.
+        """
+        if num_threads is None:
+            num_threads = os.cpu_count() or 1
+        encoded = _get_encoding().encode_ordinary_batch(
+            list(texts), num_threads=num_threads
         )
+        return [len(tokens) for tokens in encoded]
 
-    def smart_chunk(self, text, metadata=None):
+    def _split_long_paragraph(self, paragraph):
+        """
+        Slice an oversized paragraph at sentence boundaries, hard-splitting
+        any single sentence that still exceeds chunk_size
+        """
+        # Hoist attribute lookups out of the loop; these run per sentence
+        chunk_size = self.chunk_size
+        step = max(1, chunk_size - self.chunk_overlap)
+
+        pieces = []
+        buffer = ""
+
+        for sentence in _SENTENCE_RE.split(paragraph):
+            if len(sentence) > chunk_size:
+                if buffer:
+                    pieces.append(buffer)
+                    buffer = ""
+                pieces.extend(
+                    sentence[i:i + chunk_size]
+                    for i in range(0, len(sentence), step)
+                )
+            elif buffer and len(buffer) + len(sentence) + 1 > chunk_size:
+                pieces.append(buffer)
+                buffer = sentence
+            else:
+                buffer = f"{buffer} {sentence}" if buffer else sentence
+
+        if buffer:
+            pieces.append(buffer)
+        return pieces
+
+    @staticmethod
+    def _iter_paragraph_spans(text):
+        """
+        Yield (start_offset, paragraph) pairs lazily by slicing between
+        separator matches — one linear finditer pass with exact spans
+        """
+        pos = 0
+        for match in _PARA_RE.finditer(text):
+            yield pos, text[pos:match.start()]
+            pos = match.end()
+        yield pos, text[pos:]
+
+    @staticmethod
+    def _iter_paragraphs(text):
+        """
+        Yield paragraphs lazily; unlike re.split this never materializes
+        the whole paragraph list
+        """
+        for _, paragraph in DocumentChunker._iter_paragraph_spans(text):
+            yield paragraph
+
+    def _pieces_from_paragraphs(self, paragraphs):
+        """
+        Yield paragraph-or-smaller pieces from already-split paragraphs
+        """
+        chunk_size = self.chunk_size
+        for paragraph in paragraphs:
+            if not _NONWS(paragraph):
+                continue
+            if len(paragraph) <= chunk_size:
+                yield paragraph
+            else:
+                yield from self._split_long_paragraph(paragraph)
+
+    def _iter_pieces(self, text):
+        """
+        Yield paragraph-or-smaller pieces in document order
+        """
+        # One linear pass over precompiled boundaries; no recursive re-scans
+        return self._pieces_from_paragraphs(self._iter_paragraphs(text))
+
+    def iter_chunks(self, text, metadata=None):
         """
-        Chunk text intelligently
+        Generator form of smart_chunk: yields each {'text', 'metadata'}
+        dict as soon as its chunk closes, so a downstream consumer (e.g.
+        batched embedding) can start before chunking finishes and only
+        one chunk plus the overlap window is held in flight.
+        """
+        yield from self._pack_pieces(self._iter_pieces(text), metadata)
+
+    def _pack_pieces(self, pieces, metadata=None):
+        """
+        Pack a piece stream into chunk dicts with overlap carry-forward
+        """
+        if metadata is None:
+            metadata = {}
+
+        chunk_size = self.chunk_size
+        chunk_overlap = self.chunk_overlap
+        current = []
+        current_len = 0
+
+        for piece in pieces:
+            if current and current_len + len(piece) + 2 > chunk_size:
+                chunk = "\n\n".join(current)
+                if self._should_keep(chunk):
+                    yield self._create_chunk_dict(chunk, metadata)
+
+                # Carry up to chunk_overlap characters of context forward
+                overlap = []
+                overlap_len = 0
+                for prev in reversed(current):
+                    if overlap_len + len(prev) > chunk_overlap:
+                        break
+                    overlap.insert(0, prev)
+                    overlap_len += len(prev) + 2
+                current = overlap
+                current_len = overlap_len
+
+            current.append(piece)
+            current_len += len(piece) + 2
+
+        if current:
+            chunk = "\n\n".join(current)
+            if self._should_keep(chunk):
+                yield self._create_chunk_dict(chunk, metadata)
+
+    @staticmethod
+    def _create_chunk_dict(text, metadata, token_count=None):
+        """
+        Assemble one {'text', 'metadata'} chunk dict.
+        token_count, when the caller already has it in hand, is recorded
+        in the metadata so downstream token budgeting never re-encodes
+        the chunk; nothing is tokenized here when it's unknown.
+        """
+        chunk_meta = dict(metadata)
+        if token_count is not None:
+            chunk_meta['token_count'] = token_count
+        return {'text': text, 'metadata': chunk_meta}
+
+    def find_sections(self, text):
+        """
+        Locate legal section headers in document order.
+        One finditer pass over the combined alternation; returns
+        (start_offset, header_text, kind) tuples where kind is the
+        matching style ('section', 'numbered' or 'caps'). ASCII documents
+        use the Hyperscan database when the binding is installed; large
+        ones otherwise detect the caps style with the vectorized byte
+        scan, which doesn't backtrack on caps-heavy body text.
+        """
+        if hyperscan is not None and text.isascii():
+            return _find_sections_hyperscan(text)
+
+        if len(text) >= _CAPS_SCAN_MIN_CHARS and text.isascii():
+            headers = [
+                (m.start(), m.group().strip(), m.lastgroup)
+                for m in _SECTION_NOCAPS_RE.finditer(text)
+            ]
+            headers.extend(
+                (start, line.strip(), 'caps')
+                for start, line in _find_caps_headers(text)
+            )
+            headers.sort(key=lambda h: h[0])
+            return headers
+
+        return [
+            (m.start(), m.group().strip(), m.lastgroup)
+            for m in _SECTION_RE.finditer(text)
+        ]
+
+    def chunk_by_sections(self, text, metadata=None):
+        """
+        Section-aware chunking: the text is split at detected legal
+        section headers and each section is packed independently, with
+        its header recorded in metadata['section'] so citations can name
+        the clause. Falls back to plain paragraph packing when no
+        headers are found.
         """
         if metadata is None:
             metadata = {}
-            
-        chunks = self.splitter.create_documents([text], metadatas=[metadata])
-        
-        # Post-process chunks to ensure they have content
-        valid_chunks = [chunk.page_content for chunk in chunks if chunk.page_content.strip()]
-        
-        return valid_chunks
+
+        headers = self.find_sections(text)
+        if not headers:
+            return self.smart_chunk(text, metadata=metadata)
+
+        # Partition one paragraph pass over the whole document by the
+        # header offsets, rather than re-scanning each section slice.
+        # regions[0] is the preamble; regions[i+1] follows headers[i].
+        bounds = [start for start, _, _ in headers]
+        regions = [[] for _ in range(len(headers) + 1)]
+        index = 0
+        for start, paragraph in self._iter_paragraph_spans(text):
+            end = start + len(paragraph)
+            # A header without a blank line above starts mid-paragraph;
+            # cut the paragraph at each contained boundary
+            cut = start
+            while index < len(bounds) and bounds[index] < end:
+                if bounds[index] > cut:
+                    regions[index].append(paragraph[cut - start:bounds[index] - start])
+                cut = bounds[index]
+                index += 1
+            if end > cut:
+                regions[index].append(paragraph[cut - start:])
+
+        chunks = []
+        for region_index, paragraphs in enumerate(regions):
+            if region_index == 0:
+                region_meta = metadata
+            else:
+                region_meta = dict(metadata)
+                region_meta['section'] = headers[region_index - 1][1]
+            chunks.extend(self._pack_pieces(
+                self._pieces_from_paragraphs(paragraphs), region_meta
+            ))
+        return chunks
+
+    def chunk_by_tokens(self, text, metadata=None, num_threads=None,
+                        tokens=None):
+        """
+        Token-exact chunking: encode the text once, slice overlapping
+        windows of chunk_size tokens (chunk_size/chunk_overlap are in
+        tokens here, unlike the character-based smart_chunk), and decode
+        every window in a single decode_batch call so N windows cost one
+        FFI round trip into tiktoken's Rust core. Each chunk's exact
+        token count rides along in its metadata for free.
+        A caller that has already encoded the text (e.g. to budget or
+        count it) can pass the cl100k_base token list as tokens= and
+        skip the re-encode entirely.
+        """
+        if metadata is None:
+            metadata = {}
+
+        encoding = _get_encoding()
+        if tokens is None:
+            tokens = encoding.encode_ordinary(text)
+        if not tokens:
+            return []
+
+        step = max(1, self.chunk_size - self.chunk_overlap)
+        windows = [
+            tokens[start:start + self.chunk_size]
+            for start in range(0, len(tokens), step)
+        ]
+
+        if num_threads is None:
+            num_threads = os.cpu_count() or 1
+        decoded = encoding.decode_batch(windows, num_threads=num_threads)
+
+        return [
+            self._create_chunk_dict(chunk, metadata, token_count=len(window))
+            for chunk, window in zip(decoded, windows)
+            if self._should_keep(chunk)
+        ]
+
+    def chunk_stream(self, pages, metadata=None):
+        """
+        Chunk a stream of (page_number, text) pairs (e.g. from
+        pdf_processor.iter_pdf_text) without ever assembling the full
+        document text. Packing and overlap rules match iter_chunks and
+        apply across page boundaries; instead of inline page-marker text,
+        each chunk records the page its content starts on in
+        metadata['page'].
+        """
+        if metadata is None:
+            metadata = {}
+
+        chunk_size = self.chunk_size
+        chunk_overlap = self.chunk_overlap
+        current = []  # (page_number, piece) pairs
+        current_len = 0
+
+        def close_chunk():
+            chunk = "\n\n".join(piece for _, piece in current)
+            if not self._should_keep(chunk):
+                return None
+            chunk_dict = self._create_chunk_dict(chunk, metadata)
+            chunk_dict['metadata']['page'] = current[0][0]
+            return chunk_dict
+
+        for page_number, text in pages:
+            for piece in self._iter_pieces(text):
+                if current and current_len + len(piece) + 2 > chunk_size:
+                    chunk = close_chunk()
+                    if chunk is not None:
+                        yield chunk
+
+                    # Carry up to chunk_overlap characters of context forward
+                    overlap = []
+                    overlap_len = 0
+                    for prev in reversed(current):
+                        if overlap_len + len(prev[1]) > chunk_overlap:
+                            break
+                        overlap.insert(0, prev)
+                        overlap_len += len(prev[1]) + 2
+                    current = overlap
+                    current_len = overlap_len
+
+                current.append((page_number, piece))
+                current_len += len(piece) + 2
+
+        if current:
+            chunk = close_chunk()
+            if chunk is not None:
+                yield chunk
+
+    def smart_chunk(self, text, metadata=None):
+        """
+        Chunk text intelligently.
+        Whole paragraphs are packed up to chunk_size characters with
+        chunk_overlap characters of trailing context carried forward;
+        oversized paragraphs are split at sentence boundaries first.
+        Returns a list of {'text', 'metadata'} dicts; the supplied metadata
+        is carried on every chunk so callers don't need to duplicate it.
+        """
+        # Whole-document fast path: a short contract or FAQ fits in one
+        # chunk, so skip boundary scanning and packing entirely. The
+        # token count is recorded since such documents are cheap to
+        # encode and budgeting then never re-tokenizes them.
+        if len(text) <= self.chunk_size:
+            if not self._should_keep(text):
+                return []
+            return [self._create_chunk_dict(
+                text, metadata or {}, token_count=self.count_tokens(text)
+            )]
+
+        return list(self.iter_chunks(text, metadata=metadata))
+
+
+def _chunk_one(job):
+    text, metadata, chunk_size, chunk_overlap = job
+    return DocumentChunker(chunk_size, chunk_overlap).smart_chunk(
+        text, metadata=metadata
+    )
+
+
+def chunk_documents(texts, metadatas=None, chunk_size=1000, chunk_overlap=200,
+                    max_workers=None):
+    """
+    Chunk a corpus of documents in parallel across processes.
+    Boundary regexes and string packing are CPU-bound Python, so threads
+    would serialize on the GIL; one job per document mirrors the
+    page-shard extraction in pdf_processor. Returns one chunk list per
+    input document, in input order. Corpora of one document (or a single
+    worker) skip the pool, since process spawn outweighs the win.
+    """
+    texts = list(texts)
+    if metadatas is None:
+        metadatas = [None] * len(texts)
+    jobs = [
+        (text, metadata, chunk_size, chunk_overlap)
+        for text, metadata in zip(texts, metadatas)
+    ]
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if len(jobs) < 2 or max_workers < 2:
+        return [_chunk_one(job) for job in jobs]
+
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(jobs))) as executor:
+        return list(executor.map(_chunk_one, jobs, chunksize=4))
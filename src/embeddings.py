@@ -2,73 +2,357 @@
 Embeddings Module using Gemini
 """
 import google.generativeai as genai
+import asyncio
+import functools
+import itertools
 import logging
+import os
+import random
 import time
 
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from google.api_core.exceptions import ResourceExhausted
+
+from .genai_session import configure_once
+
+# Optional SIMD cosine kernels (AVX-512/NEON with runtime dispatch). For
+# single 768-dim pairs they skip most of NumPy's per-call overhead; the
+# batched matrix scans stay on BLAS, which already saturates there.
+try:
+    import simsimd
+except ImportError:
+    simsimd = None
+
 logger = logging.getLogger(__name__)
 
+# Reactive rate-limit handling: call at full speed and back off exponentially
+# (with jitter) only when Gemini actually returns a 429
+_MAX_RETRIES = 6
+_BACKOFF_MAX = 32.0
+
+
+def _backoff_delay(attempt):
+    return min(_BACKOFF_MAX, 2.0 ** attempt) * (0.5 + random.random() / 2)
+
+# Storage dtype for document embeddings. float16 halves memory and on-disk
+# cache size with negligible recall loss (Gemini embeddings are L2-normalized);
+# vectors are widened back to float32 at the Chroma boundary.
+_STORAGE_DTYPE = (
+    np.float16 if os.getenv("EMBEDDING_DTYPE", "float32") == "float16"
+    else np.float32
+)
+
 class GeminiEmbedder:
     def __init__(self, api_key, model_name="models/text-embedding-004"):
-        genai.configure(api_key=api_key)
+        configure_once(api_key)
         self.model_name = model_name
-        
-    def embed_chunks(self, chunks, batch_size=10):
-        """
-        Embed a list of text chunks with batching and rate limiting
-        """
-        embeddings = []
-        
-        for i in range(0, len(chunks), batch_size):
-            batch = chunks[i:i + batch_size]
+        # Per-instance LRU over exact query strings; errors are raised by the
+        # uncached helper so failures are never cached
+        self._embed_query_cached = functools.lru_cache(maxsize=2048)(
+            self._embed_query_uncached
+        )
+        # Lazily created and kept for the life of the embedder, so
+        # repeated ingests reuse warm threads (and their keep-alive HTTP
+        # connections) instead of spawning a pool per call
+        self._executor = None
+
+    def _get_executor(self, max_workers):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="embed"
+            )
+        return self._executor
+
+    def _embed_content_with_backoff(self, content, task_type):
+        for attempt in range(_MAX_RETRIES):
             try:
-                # Gemini embedding API
-                result = genai.embed_content(
+                return genai.embed_content(
                     model=self.model_name,
-                    content=batch,
-                    task_type="retrieval_document"
+                    content=content,
+                    task_type=task_type
                 )
-                
-                # Check format of result (can vary by version)
-                if 'embedding' in result:
-                    embeddings.extend(result['embedding'])
-                else:
-                    # Handle batch list output
-                    for entry in result['embedding']: 
-                         embeddings.append(entry)
-                         
-                # Rate limit safety
-                time.sleep(0.5)
-                
-            except Exception as e:
-                logger.error(f"Error embedding batch {i}: {str(e)}")
-                # If batch fails, try individual? For now, raise or skip
-                # Simple fallback: try one by one if batch fails
-                for text in batch:
-                    try:
-                        res = genai.embed_content(
-                            model=self.model_name,
-                            content=text,
-                            task_type="retrieval_document"
-                        )
-                        embeddings.append(res['embedding'])
-                        time.sleep(0.2)
-                    except Exception as inner_e:
-                        logger.error(f"Failed to embed chunk: {inner_e}")
-                        embeddings.append(None) # Keep index alignment
-                        
+            except ResourceExhausted:
+                if attempt == _MAX_RETRIES - 1:
+                    raise
+                delay = _backoff_delay(attempt)
+                logger.warning(f"Rate limited; retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    async def _aembed_content_with_backoff(self, content, task_type):
+        for attempt in range(_MAX_RETRIES):
+            try:
+                return await genai.embed_content_async(
+                    model=self.model_name,
+                    content=content,
+                    task_type=task_type
+                )
+            except ResourceExhausted:
+                if attempt == _MAX_RETRIES - 1:
+                    raise
+                delay = _backoff_delay(attempt)
+                logger.warning(f"Rate limited; retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    def embed_batch(self, texts, task_type="retrieval_document"):
+        """
+        Embed a list of texts with a single batched API call.
+        A failed batch is retried in halves, so one bad text degrades to
+        O(log N) batched calls instead of losing the whole batch.
+        """
+        try:
+            result = self._embed_content_with_backoff(texts, task_type)
+            # Compact ndarray rows instead of Python float lists
+            return [np.asarray(e, dtype=_STORAGE_DTYPE) for e in result['embedding']]
+        except Exception as e:
+            if len(texts) == 1:
+                logger.error(f"Failed to embed text: {str(e)}")
+                return [None] # Keep index alignment
+            logger.warning(f"Batch of {len(texts)} failed; retrying halves: {str(e)}")
+            half = len(texts) // 2
+            return (self.embed_batch(texts[:half], task_type=task_type)
+                    + self.embed_batch(texts[half:], task_type=task_type))
+
+    def embed_chunks(self, chunks, batch_size=10, concurrency=8):
+        """
+        Embed a list of text chunks.
+        Sync wrapper over the concurrent async path; batches are dispatched
+        in parallel instead of the old serial loop with fixed sleeps.
+        """
+        return asyncio.run(
+            self.aembed_chunks(chunks, batch_size=batch_size, concurrency=concurrency)
+        )
+
+    def embed_chunks_threaded(self, chunks, batch_size=10, max_workers=8):
+        """
+        Thread-pool variant of embed_chunks for callers that already sit
+        inside a running event loop (asyncio.run can't nest). Batches are
+        network-bound, so threads overlap them fine; results are written
+        back into a pre-sized list so order is preserved regardless of
+        completion order. Rate limiting stays reactive via the 429
+        backoff in embed_batch.
+        Duplicate texts (legal boilerplate: definitions, signature
+        blocks) are embedded once and fanned back out, so repeats cost a
+        dict lookup instead of an API call.
+        chunks may be strings or the {'text', 'metadata'} chunk dicts,
+        matching the embed_chunks/aembed_chunks contract.
+        """
+        texts = [
+            chunk['text'] if isinstance(chunk, dict) else chunk
+            for chunk in chunks
+        ]
+        unique = list(dict.fromkeys(texts))
+        embeddings = [None] * len(unique)
+        executor = self._get_executor(max_workers)
+        futures = {
+            executor.submit(self.embed_batch, unique[start:start + batch_size]): start
+            for start in range(0, len(unique), batch_size)
+        }
+        for future in as_completed(futures):
+            start = futures[future]
+            for offset, embedding in enumerate(future.result()):
+                embeddings[start + offset] = embedding
+        if len(unique) == len(texts):
+            return embeddings
+        by_text = dict(zip(unique, embeddings))
+        return [by_text[text] for text in texts]
+
+    async def aembed_chunks(self, chunks, batch_size=10, concurrency=8):
+        """
+        Embed chunks by issuing batch requests concurrently.
+        Concurrency is bounded by a semaphore to stay inside rate limits.
+        chunks may be any iterable of strings or chunk dicts (the
+        {'text', 'metadata'} shape the chunkers emit), so a chunking
+        generator (DocumentChunker.iter_chunks) can feed the embedder
+        without materializing the whole document's chunk list first.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def embed_batch(batch):
+            async with semaphore:
+                try:
+                    result = await self._aembed_content_with_backoff(
+                        batch, "retrieval_document"
+                    )
+                    return [np.asarray(e, dtype=_STORAGE_DTYPE) for e in result['embedding']]
+                except Exception as e:
+                    if len(batch) == 1:
+                        logger.error(f"Failed to embed chunk: {str(e)}")
+                        return [None] # Keep index alignment
+                    logger.warning(
+                        f"Batch of {len(batch)} failed; retrying halves: {str(e)}"
+                    )
+
+            # Binary subdivision isolates the offending chunk in O(log N)
+            # batched calls instead of N per-item retries. Recurse outside
+            # the semaphore so the halves reacquire it themselves.
+            half = len(batch) // 2
+            left, right = await asyncio.gather(
+                embed_batch(batch[:half]),
+                embed_batch(batch[half:])
+            )
+            return left + right
+
+        chunk_iter = (
+            chunk['text'] if isinstance(chunk, dict) else chunk
+            for chunk in chunks
+        )
+        batches = iter(lambda: list(itertools.islice(chunk_iter, batch_size)), [])
+        results = await asyncio.gather(*[embed_batch(b) for b in batches])
+
+        # Flatten in original batch order to keep index alignment
+        embeddings = []
+        for batch_embeddings in results:
+            embeddings.extend(batch_embeddings)
         return embeddings
 
-    def embed_query(self, query):
+    async def aembed_query(self, query):
         """
-        Embed a single query string
+        Async variant of embed_query
         """
         try:
-            result = genai.embed_content(
-                model=self.model_name,
-                content=query,
-                task_type="retrieval_query"
+            result = await self._aembed_content_with_backoff(
+                query, "retrieval_query"
             )
-            return result['embedding']
+            return np.asarray(result['embedding'], dtype=np.float32)
+        except Exception as e:
+            logger.error(f"Error embedding query: {str(e)}")
+            return None
+
+    def _embed_query_uncached(self, query):
+        result = self._embed_content_with_backoff(query, "retrieval_query")
+        # Tuples are hashable and safe to share from the cache
+        return tuple(result['embedding'])
+
+    def embed_queries(self, queries):
+        """
+        Embed several query strings with a single batched API call.
+        For K expanded queries (multi-query retrieval, HyDE and the like)
+        this costs one round trip instead of K. Failed batches yield a
+        None per query, mirroring embed_batch.
+        """
+        queries = list(queries)
+        try:
+            result = self._embed_content_with_backoff(queries, "retrieval_query")
+            return [np.asarray(e, dtype=np.float32) for e in result['embedding']]
+        except Exception as e:
+            logger.error(f"Error embedding {len(queries)} queries: {str(e)}")
+            return [None] * len(queries)
+
+    def embed_query(self, query):
+        """
+        Embed a single query string, memoized per exact string.
+        Leading/trailing whitespace is stripped before keying, so
+        trivially re-sent variants of the same question share one cache
+        entry (case is preserved: it can carry meaning for embeddings).
+        """
+        try:
+            return np.asarray(self._embed_query_cached(query.strip()), dtype=np.float32)
         except Exception as e:
             logger.error(f"Error embedding query: {str(e)}")
             return None
+
+    def query_cache_info(self):
+        """
+        Hit/miss statistics for the query-embedding cache, with a derived
+        hit_rate (0.0 while the cache is untouched). Useful for sizing
+        the cache against real query traffic.
+        """
+        info = self._embed_query_cached.cache_info()
+        total = info.hits + info.misses
+        return {
+            "hits": info.hits,
+            "misses": info.misses,
+            "size": info.currsize,
+            "hit_rate": info.hits / total if total else 0.0,
+        }
+
+    @staticmethod
+    def normalize_rows(embeddings):
+        """
+        Stack embeddings into one contiguous float32 matrix with unit
+        rows. Done once at insert time, so similarity scans pay no
+        per-row norm: against a unit query, cosine collapses to a plain
+        dot product (the matrix-vector product in batch_similarity).
+        """
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.maximum(norms, np.float32(1e-12), out=norms)
+        return matrix / norms
+
+    @staticmethod
+    def batch_similarity(matrix, query):
+        """
+        Cosine similarity of one query against N stored embeddings in a
+        single BLAS matrix-vector product. matrix must be a contiguous
+        float32 [N, dim] array with L2-normalized rows (normalize_rows).
+        """
+        query = np.asarray(query, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return np.zeros(len(matrix), dtype=np.float32)
+        return matrix @ (query / norm)
+
+    @staticmethod
+    def top_k_similar(matrix, query, k=5):
+        """
+        Indices and scores of the k rows most similar to query, best
+        first. argpartition picks the k candidates in O(N) and only
+        those are sorted, instead of sorting all N scores to read off k.
+        matrix follows the batch_similarity contract (contiguous float32,
+        unit rows).
+        """
+        scores = GeminiEmbedder.batch_similarity(matrix, query)
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+        idx = np.argpartition(-scores, k - 1)[:k]
+        idx = idx[np.argsort(-scores[idx])]
+        return idx, scores[idx]
+
+    @staticmethod
+    def calculate_similarity(a, b):
+        """
+        Cosine similarity between two embeddings; 0.0 on zero-norm input.
+        Uses the simsimd kernel when installed (it returns a distance,
+        hence the 1 - x), falling back to a plain BLAS dot.
+        """
+        a = np.asarray(a, dtype=np.float32)
+        b = np.asarray(b, dtype=np.float32)
+        denom = float(np.linalg.norm(a)) * float(np.linalg.norm(b))
+        if denom == 0.0:
+            return 0.0
+        if simsimd is not None:
+            return 1.0 - float(simsimd.cosine(a, b))
+        return float(a @ b) / denom
+
+
+def quantize_int8(embeddings):
+    """
+    Symmetric int8 quantization of embeddings: rows are L2-normalized
+    then scaled by 127 and rounded. Cosine ranking survives the rounding
+    for retrieval purposes while storage and scan bandwidth drop 4x vs
+    float32; score quantized rows with int8_batch_similarity.
+    """
+    matrix = GeminiEmbedder.normalize_rows(embeddings)
+    return np.clip(np.round(matrix * 127.0), -127, 127).astype(np.int8)
+
+
+def int8_batch_similarity(matrix, query):
+    """
+    Approximate cosine scores of one quantized row against a quantized
+    matrix (both from quantize_int8; the shared scale cancels in cosine).
+    NumPy keeps int8 @ int8 in int8 and overflows at 768 dims, so both
+    sides are widened to int32 for the accumulation; dividing by 127^2
+    maps the scores back onto the float cosine scale.
+    """
+    scores = matrix.astype(np.int32) @ np.asarray(query, dtype=np.int32)
+    return scores.astype(np.float32) / np.float32(127 * 127)
+
+
+def dequantize_int8(matrix):
+    """
+    Recover approximately unit-norm float32 rows from quantize_int8
+    output
+    """
+    return matrix.astype(np.float32) / np.float32(127.0)
@@ -2,60 +2,228 @@
 Gemini Client for RAG Answer Generation
 """
 import google.generativeai as genai
+import datetime
+import functools
+import hashlib
 import logging
+import os
 import time
 
+from google.generativeai import caching
+
+from .chunking import _get_encoding
+from .genai_session import configure_once
+
 logger = logging.getLogger(__name__)
 
+# Contexts below this size aren't worth an explicit cache upload (the API
+# also enforces a minimum cached token count)
+_CONTEXT_CACHE_MIN_CHARS = int(os.getenv("CONTEXT_CACHE_MIN_CHARS", 16384))
+_CONTEXT_CACHE_TTL = datetime.timedelta(minutes=5)
+# Don't hand out a handle this close to its server-side expiry: the
+# generation call it's for may land after the cache is gone
+_CONTEXT_CACHE_SLACK = 15.0
+
+# Optional cap on retrieved-context size, in tokens; 0 disables budgeting
+_CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 0))
+
+
+@functools.lru_cache(maxsize=8)
+def _split_template(system_prompt):
+    """
+    Split a prompt template at its {context} / {question} placeholders.
+    Memoized so the few KB template is scanned once per process, not on
+    every question.
+    """
+    head, _, rest = system_prompt.partition("{context}")
+    mid, _, tail = rest.partition("{question}")
+    return head, mid, tail
+
 class GeminiRAGClient:
     def __init__(self, api_key, model_name="gemini-2.5-flash"):
-        genai.configure(api_key=api_key)
+        configure_once(api_key)
+        self.model_name = model_name
         self.model = genai.GenerativeModel(model_name)
-        
+        # Explicit context caches for this client, keyed by content hash:
+        # digest -> (model, monotonic creation time). Entries older than
+        # the TTL are dead server-side and must be recreated, not reused.
+        self._context_cache = {}
+
+    def _cached_model(self, digest):
+        """
+        Return a live cached-content model for digest, or None if there
+        is none or the stored one is at/past its server-side TTL
+        """
+        entry = self._context_cache.get(digest)
+        if entry is None:
+            return None
+        model, created = entry
+        age = time.monotonic() - created
+        if age >= _CONTEXT_CACHE_TTL.total_seconds() - _CONTEXT_CACHE_SLACK:
+            del self._context_cache[digest]
+            return None
+        return model
+
+    def _select_chunks(self, context_chunks):
+        """
+        Apply the optional token budget to retrieved chunks.
+        Chunks are kept in retrieval (relevance) order until the budget
+        runs out, counted in actual tokens rather than characters.
+        Precomputed metadata['token_count'] is trusted when present.
+        Without one, a cheap ~4-chars-per-token estimate decides first
+        and the real tokenizer only runs when the estimate lands close
+        enough to the boundary that being wrong would flip the decision,
+        so budgeting usually costs no tokenization at all. Always keeps
+        at least one chunk.
+        """
+        if _CONTEXT_TOKEN_BUDGET <= 0:
+            return context_chunks
+
+        encoding = _get_encoding()
+        separator_cost = len(encoding.encode_ordinary("\n\n---\n\n"))
+        remaining = _CONTEXT_TOKEN_BUDGET
+        kept = []
+        for chunk in context_chunks:
+            if isinstance(chunk, dict):
+                text = chunk['text']
+                cost = chunk.get('metadata', {}).get('token_count')
+            else:
+                text = chunk
+                cost = None
+            separator = separator_cost if kept else 0
+            if cost is None:
+                estimate = len(text) // 4
+                margin = max(16, estimate // 4)
+                if estimate + margin + separator <= remaining:
+                    cost = estimate
+                elif estimate - margin + separator > remaining:
+                    break
+                else:
+                    cost = len(encoding.encode_ordinary(text))
+            cost += separator
+            if cost > remaining:
+                break
+            kept.append(chunk)
+            remaining -= cost
+
+        return kept or context_chunks[:1]
+
+    def select_context(self, context_chunks):
+        """
+        Public entry to the context token budget. Streaming callers must
+        pass retrieved chunks through here before generate_answer_stream
+        and build_sources, so the citations list only chunks the model
+        actually received. Re-applying the budget to an already-selected
+        list keeps it unchanged, so the internal pass in
+        _generation_target stays a cheap no-op.
+        """
+        return self._select_chunks(context_chunks)
+
+    def _generation_target(self, question, context_chunks, system_prompt):
+        """
+        Pick the (model, prompt) pair for this call.
+        In a chat session the same retrieved context often recurs across
+        questions; large contexts are uploaded once as explicit
+        CachedContent so follow-ups only pay for the question tokens.
+        Falls back to the plain model with the full prompt if caching is
+        unavailable.
+        """
+        context_chunks = self._select_chunks(context_chunks)
+        context_texts = [chunk["text"] if isinstance(chunk, dict) else chunk for chunk in context_chunks]
+        context_text = "\n\n---\n\n".join(context_texts)
+
+        head, mid, tail = _split_template(system_prompt)
+        if "{question}" in system_prompt and len(context_text) >= _CONTEXT_CACHE_MIN_CHARS:
+            try:
+                cached_head = "".join((head, context_text, mid))
+                digest = hashlib.sha256(cached_head.encode()).hexdigest()
+                model = self._cached_model(digest)
+                if model is None:
+                    cached = caching.CachedContent.create(
+                        model=self.model_name,
+                        contents=[cached_head],
+                        ttl=_CONTEXT_CACHE_TTL
+                    )
+                    model = genai.GenerativeModel.from_cached_content(cached)
+                    self._context_cache[digest] = (model, time.monotonic())
+                # cached_head + question + tail reassembles the original prompt
+                return model, f"{question}{tail}"
+            except Exception as e:
+                logger.warning(f"Context caching unavailable: {str(e)}")
+
+        return self.model, self._build_prompt(question, context_chunks, system_prompt)
+
+    def _build_prompt(self, question, context_chunks, system_prompt):
+        """
+        Assemble the full RAG prompt in a single join.
+        str.format would copy the multi-KB joined context a second time
+        into the template; splitting the template at its placeholders and
+        interleaving the chunks directly builds the prompt in one pass.
+        """
+        head, mid, tail = _split_template(system_prompt)
+
+        parts = [head]
+        for i, chunk in enumerate(context_chunks):
+            if i:
+                parts.append("\n\n---\n\n")
+            parts.append(chunk["text"] if isinstance(chunk, dict) else chunk)
+        parts.extend((mid, question, tail))
+        return "".join(parts)
+
+    def generate_answer_stream(self, question, context_chunks, system_prompt):
+        """
+        Stream the answer as text deltas while Gemini generates it.
+        Pass chunks through select_context first, then call
+        build_sources on that same list afterwards for the citations.
+        """
+        model, prompt = self._generation_target(question, context_chunks, system_prompt)
+        response = model.generate_content(prompt, stream=True)
+        for part in response:
+            if part.text:
+                yield part.text
+
+    def build_sources(self, context_chunks):
+        """
+        Build the citation payload from the retrieved chunks
+        """
+        sources = []
+        for i, chunk in enumerate(context_chunks):
+            if isinstance(chunk, dict):
+                text = chunk["text"]
+                similarity = chunk.get("similarity", 0.0)
+                metadata = chunk.get("metadata", {})
+                source_name = metadata.get("source", "N/A")
+            else:
+                text = chunk
+                similarity = 0.0
+                source_name = "N/A"
+
+            sources.append({
+                "source_number": i + 1,
+                "section": f"Source: {source_name}",
+                "page": "N/A",
+                "similarity": similarity,
+                "text_preview": text[:200] + "..."
+            })
+        return sources
+
     def generate_answer(self, question, context_chunks, system_prompt):
         """
         Generate answer using Gemini with retrieved context
         """
         try:
-            # Prepare context
-            # context_chunks is a list of dicts now
-            context_texts = [chunk["text"] if isinstance(chunk, dict) else chunk for chunk in context_chunks]
-            context_text = "\n\n---\n\n".join(context_texts)
-            
-            # Construct prompt
-            full_prompt = system_prompt.format(
-                context=context_text,
-                question=question
-            )
-            
+            # Budget once up front so the prompt and the citations are
+            # built from the same chunk list
+            context_chunks = self._select_chunks(context_chunks)
+            model, prompt = self._generation_target(question, context_chunks, system_prompt)
+
             # Generate response
-            response = self.model.generate_content(full_prompt)
-            
-            # Extract sources
-            sources = []
-            for i, chunk in enumerate(context_chunks):
-                if isinstance(chunk, dict):
-                    text = chunk["text"]
-                    similarity = chunk.get("similarity", 0.0)
-                    metadata = chunk.get("metadata", {})
-                    source_name = metadata.get("source", "N/A")
-                else:
-                    text = chunk
-                    similarity = 0.0
-                    source_name = "N/A"
-                    
-                sources.append({
-                    "source_number": i + 1,
-                    "section": f"Source: {source_name}",
-                    "page": "N/A", 
-                    "similarity": similarity, 
-                    "text_preview": text[:200] + "..."
-                })
+            response = model.generate_content(prompt)
 
             return {
                 "success": True,
                 "answer": response.text,
-                "sources": sources
+                "sources": self.build_sources(context_chunks)
             }
             
         except Exception as e:
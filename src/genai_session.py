@@ -0,0 +1,19 @@
+"""
+Shared Gemini SDK configuration
+"""
+import google.generativeai as genai
+
+_configured_key = None
+
+
+def configure_once(api_key):
+    """
+    Configure the google.generativeai SDK at most once per key.
+    genai.configure sets module-global state, so re-calling it from every
+    client constructor (which Streamlit reruns trigger constantly) only
+    tears down and rebuilds the shared channel for nothing.
+    """
+    global _configured_key
+    if api_key != _configured_key:
+        genai.configure(api_key=api_key)
+        _configured_key = api_key
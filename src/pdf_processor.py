@@ -2,34 +2,109 @@
 PDF Processing Module
 """
 import pdfplumber
+import io
 import os
 import logging
+from concurrent.futures import ProcessPoolExecutor
+
+# Optional C-backed extractor (PDFium); 10-30x faster than pdfplumber's
+# pure-Python layout analysis for plain text. PDF_BACKEND=pdfplumber forces
+# the fallback, e.g. when table-aware extraction matters.
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
 
 logger = logging.getLogger(__name__)
 
+_USE_PDFIUM = pdfium is not None and os.getenv("PDF_BACKEND", "pdfium") != "pdfplumber"
+
+# Below this page count, process-spawn overhead outweighs the parallel win
+_PARALLEL_MIN_PAGES = 8
+
+
+def _extract_all_pdfium(file_path):
+    """
+    Extract every page's text with PDFium (native code)
+    """
+    pdf = pdfium.PdfDocument(file_path)
+    try:
+        return [page.get_textpage().get_text_range() for page in pdf]
+    finally:
+        pdf.close()
+
+
+def _build_extraction_result(page_texts):
+    """
+    Assemble the extraction result dict from per-page texts
+    """
+    text_content = []
+    for i, page_text in enumerate(page_texts):
+        if page_text:
+            # Add page marker for context
+            text_content.append(f"--- Page {i+1} ---\n{page_text}")
+
+    return {
+        "success": True,
+        "text": "\n\n".join(text_content),
+        "page_count": len(text_content)
+    }
+
+
+def _extract_range(file_path, start, end):
+    """
+    Extract a contiguous page range [start, end). Runs in a worker process,
+    which opens the PDF independently because pdfplumber objects aren't
+    picklable; one open amortizes over the whole shard.
+    """
+    with pdfplumber.open(file_path) as pdf:
+        return start, [pdf.pages[i].extract_text() for i in range(start, end)]
+
+
 def extract_text_from_pdf(file_path):
     """
-    Extract text from PDF file using pdfplumber
+    Extract text from PDF file.
+    Uses PDFium when available; otherwise falls back to pdfplumber, with
+    large documents extracted page-parallel across processes since that
+    layout analysis is CPU-bound pure Python.
     Returns dict with success status and text
     """
     try:
-        text_content = []
-        
+        if _USE_PDFIUM:
+            # Native extraction is fast enough that no process pool is needed
+            page_texts = _extract_all_pdfium(file_path)
+            return _build_extraction_result(page_texts)
+
+        page_texts = None
         with pdfplumber.open(file_path) as pdf:
-            for i, page in enumerate(pdf.pages):
-                page_text = page.extract_text()
-                if page_text:
-                    # Add page marker for context
-                    text_content.append(f"--- Page {i+1} ---\n{page_text}")
-        
-        full_text = "\n\n".join(text_content)
-        
-        return {
-            "success": True,
-            "text": full_text,
-            "page_count": len(text_content)
-        }
-        
+            page_count = len(pdf.pages)
+            if page_count < _PARALLEL_MIN_PAGES:
+                page_texts = [page.extract_text() for page in pdf.pages]
+
+        if page_texts is None:
+            max_workers = int(os.getenv("MAX_PDF_WORKERS", os.cpu_count() or 1))
+
+            # One contiguous shard per worker so each process opens the PDF once
+            n_shards = min(max_workers, page_count)
+            shard_size = -(-page_count // n_shards)  # ceil division
+            shards = [
+                (start, min(start + shard_size, page_count))
+                for start in range(0, page_count, shard_size)
+            ]
+
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = [
+                    executor.submit(_extract_range, file_path, start, end)
+                    for start, end in shards
+                ]
+                results = sorted(f.result() for f in futures)
+
+            page_texts = []
+            for _, shard_texts in results:
+                page_texts.extend(shard_texts)
+
+        return _build_extraction_result(page_texts)
+
     except Exception as e:
         logger.error(f"Error extracting text from PDF: {str(e)}")
         return {
@@ -37,6 +112,33 @@ def extract_text_from_pdf(file_path):
             "error": str(e)
         }
 
+def iter_pdf_text(file_path):
+    """
+    Yield (page_number, text) pairs lazily, one page at a time.
+    Lets a caller stream pages straight into chunking (see
+    DocumentChunker.chunk_stream) without the full document text ever
+    being materialized. Serial by design: a streaming consumer can't use
+    the process-parallel shard path, and with PDFium the per-page cost is
+    native-code cheap anyway. Empty pages are skipped.
+    """
+    if _USE_PDFIUM:
+        pdf = pdfium.PdfDocument(file_path)
+        try:
+            for i, page in enumerate(pdf):
+                text = page.get_textpage().get_text_range()
+                if text:
+                    yield i + 1, text
+        finally:
+            pdf.close()
+        return
+
+    with pdfplumber.open(file_path) as pdf:
+        for i, page in enumerate(pdf.pages):
+            text = page.extract_text()
+            if text:
+                yield i + 1, text
+
+
 def get_pdf_metadata(file_path):
     """
     Get metadata from PDF file
@@ -47,3 +149,14 @@ def get_pdf_metadata(file_path):
     except Exception as e:
         logger.error(f"Error getting metadata: {str(e)}")
         return {}
+
+def get_pdf_metadata_from_bytes(file_bytes):
+    """
+    Get metadata from in-memory PDF bytes, avoiding extra disk I/O
+    """
+    try:
+        with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
+            return pdf.metadata
+    except Exception as e:
+        logger.error(f"Error getting metadata: {str(e)}")
+        return {}
@@ -0,0 +1,103 @@
+"""
+Semantic Query Cache
+"""
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticQueryCache:
+    """
+    Bounded cache of query embeddings and their computed payloads
+    (retrieval results, generated answers). Real query streams repeat:
+    the same and near-paraphrased questions dominate, so a hit here skips
+    the whole search-and-generate pipeline.
+
+    Vectors are L2-normalized at insert and kept as rows of one
+    contiguous float32 matrix, so a lookup is a single matrix-vector
+    product plus an argmax rather than a Python loop over entries. A hit
+    is any cached query within tau cosine similarity of the incoming
+    one. When full, the least recently used entry's row is overwritten
+    in place, so the matrix never needs re-stacking.
+    """
+
+    def __init__(self, max_entries=256, tau=0.95):
+        self.max_entries = max_entries
+        self.tau = tau
+        self._matrix = None  # float32 [n, dim], unit rows
+        self._payloads = []
+        self._stamps = []    # per-entry last-use tick, for LRU eviction
+        self._clock = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._payloads)
+
+    @staticmethod
+    def _normalize(embedding):
+        q = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm == 0:
+            return None
+        return q / norm
+
+    def lookup(self, query_embedding):
+        """
+        Return the payload of the closest cached query if it clears the
+        tau threshold, else None
+        """
+        if not self._payloads:
+            self.misses += 1
+            return None
+        q = self._normalize(query_embedding)
+        if q is None:
+            self.misses += 1
+            return None
+
+        # Rows past the filled count are uninitialized; score only the live ones
+        similarities = self._matrix[:len(self._payloads)] @ q
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.tau:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._clock += 1
+        self._stamps[best] = self._clock
+        return self._payloads[best]
+
+    def add(self, query_embedding, payload):
+        """
+        Cache a payload under its query embedding, evicting the least
+        recently used entry when full
+        """
+        q = self._normalize(query_embedding)
+        if q is None:
+            return
+        self._clock += 1
+
+        if self._matrix is None:
+            self._matrix = np.empty((self.max_entries, len(q)), dtype=np.float32)
+
+        if len(self._payloads) < self.max_entries:
+            slot = len(self._payloads)
+            self._payloads.append(payload)
+            self._stamps.append(self._clock)
+        else:
+            slot = self._stamps.index(min(self._stamps))
+            self._payloads[slot] = payload
+            self._stamps[slot] = self._clock
+        self._matrix[slot] = q
+
+    def stats(self):
+        """Hit/miss counters with a derived hit_rate, for cache sizing"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._payloads),
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -6,8 +6,20 @@ import logging
 import os
 import uuid
 
+import numpy as np
+
 logger = logging.getLogger(__name__)
 
+# HNSW index tuning for high-dimensional Gemini vectors, overridable via env.
+# Cosine space matches how the similarity scores are interpreted downstream.
+_HNSW_METADATA = {
+    "hnsw:space": os.getenv("CHROMA_HNSW_SPACE", "cosine"),
+    "hnsw:M": int(os.getenv("CHROMA_HNSW_M", 32)),
+    "hnsw:construction_ef": int(os.getenv("CHROMA_HNSW_CONSTRUCTION_EF", 128)),
+    "hnsw:search_ef": int(os.getenv("CHROMA_HNSW_SEARCH_EF", 64)),
+}
+
+
 class VectorStore:
     def __init__(self, persist_dir="./data/vectordb"):
         # Ensure directory exists
@@ -15,7 +27,7 @@ class VectorStore:
             os.makedirs(persist_dir)
             
         self.client = chromadb.PersistentClient(path=persist_dir)
-        
+
     def create_collection(self, name, reset=False):
         """
         Get or create a collection
@@ -28,50 +40,103 @@ class VectorStore:
                     pass # Collection didn't exist or couldn't be deleted
             
             # Create new
-            return self.client.get_or_create_collection(name=name)
+            return self.client.get_or_create_collection(
+                name=name,
+                metadata=_HNSW_METADATA
+            )
         except Exception as e:
             logger.error(f"Error creating collection: {str(e)}")
             raise
 
-    def add_documents(self, collection, embeddings, documents, metadatas=None):
+    def get_or_create_collection(self, name):
         """
-        Add documents to collection
+        Get an existing collection or create it, never discarding the index
         """
-        if not embeddings:
+        try:
+            return self.client.get_or_create_collection(
+                name=name,
+                metadata=_HNSW_METADATA
+            )
+        except Exception as e:
+            logger.error(f"Error getting collection: {str(e)}")
+            raise
+
+    def add_documents(self, collection, embeddings, documents, metadatas=None,
+                      ids=None, doc_id=None):
+        """
+        Add documents to collection.
+        Deterministic ids (caller-supplied content hashes, or "{doc_id}:{i}")
+        make the write an idempotent upsert: re-ingesting the same chunk
+        overwrites instead of duplicating.
+        """
+        if embeddings is None or len(embeddings) == 0:
             return 0
-            
+
         count = len(embeddings)
-        ids = [str(uuid.uuid4()) for _ in range(count)]
-        
+        if ids is None:
+            # One uuid per call at most; per-row uuid4 meant a urandom
+            # syscall per chunk and no dedup across re-uploads
+            prefix = doc_id if doc_id is not None else uuid.uuid4().hex
+            ids = [f"{prefix}:{i}" for i in range(count)]
+
         # Ensure documents is a list matching embeddings length
         if len(documents) != count:
             logger.error(f"Mismatch: {len(documents)} docs vs {count} embeddings")
             raise ValueError("Documents and embeddings counts must match")
 
-        # Filter out failed embeddings (None)
-        valid_indices = [i for i, emb in enumerate(embeddings) if emb is not None]
-        
-        if len(valid_indices) < len(embeddings):
-            logger.warning(f"Dropping {len(embeddings) - len(valid_indices)} chunks due to embedding errors")
-            
-        if not valid_indices:
-            logger.error("No valid embeddings to add")
-            return 0
-            
-        # Filter data based on valid indices
-        embeddings = [embeddings[i] for i in valid_indices]
-        ids = [ids[i] for i in valid_indices]
-        documents = [documents[i] for i in valid_indices]
-        metadatas = [metadatas[i] for i in valid_indices]
-            
+        if isinstance(embeddings, np.ndarray) and embeddings.ndim == 2:
+            # Already a contiguous matrix (e.g. memory-mapped from the
+            # process cache): no None rows possible, skip the filtering
+            # pass and just make sure of dtype and contiguity
+            embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        else:
+            # Single pass: drop failed embeddings from all parallel sequences at once
+            if metadatas is None:
+                metadatas = [None] * count
+            kept = [
+                row for row in zip(ids, embeddings, documents, metadatas)
+                if row[1] is not None
+            ]
+
+            if len(kept) < count:
+                logger.warning(f"Dropping {count - len(kept)} chunks due to embedding errors")
+
+            if not kept:
+                logger.error("No valid embeddings to add")
+                return 0
+
+            ids, embeddings, documents, metadatas = (list(col) for col in zip(*kept))
+
+            # Stack into one contiguous float32 matrix; Chroma ingests the
+            # buffer directly without per-float conversion
+            embeddings = np.asarray(embeddings, dtype=np.float32)
+            if metadatas[0] is None:
+                metadatas = None
+
+        # Chroma rejects duplicate ids within one upsert, and content-hash
+        # ids repeat whenever a document repeats a chunk's text verbatim
+        # (boilerplate). Keep the first occurrence per id — across calls
+        # the same id would overwrite anyway.
+        if len(set(ids)) != len(ids):
+            seen = set()
+            keep = [
+                i for i, chunk_id in enumerate(ids)
+                if not (chunk_id in seen or seen.add(chunk_id))
+            ]
+            ids = [ids[i] for i in keep]
+            documents = [documents[i] for i in keep]
+            embeddings = embeddings[keep]
+            if metadatas is not None:
+                metadatas = [metadatas[i] for i in keep]
+
         try:
-            collection.add(
+            collection.upsert(
                 ids=ids,
                 embeddings=embeddings,
                 documents=documents,
                 metadatas=metadatas
             )
-            return len(valid_indices)
+            return len(ids)
             
         except Exception as e:
              logger.error(f"Error adding documents: {str(e)}")
@@ -82,6 +147,9 @@ class VectorStore:
         Search for relevant documents
         """
         try:
+            # Hand Chroma a float32 ndarray, not a Python list: lists are
+            # re-validated and converted element-by-element on every query
+            query_embedding = np.asarray(query_embedding, dtype=np.float32)
             results = collection.query(
                 query_embeddings=[query_embedding],
                 n_results=top_k,